@@ -0,0 +1,829 @@
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from data_classes import Conference_system, Attendee, Exhibition, Workshop
+from storage import PickleStorage, SQLiteStorage
+from sales import SalesColumns, format_daily_report
+from server import ConferenceService
+from bulk_import import import_file
+from fsck import verify, repair
+from id_allocator import TicketIdAllocator
+import datafile
+from snapshot import SnapshotStorage, write_snapshot
+
+
+# =======================
+# HELPERS
+# =======================
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f} s")
+    return result
+
+
+def make_attendees(n):
+    return [Attendee(f"user{i}@greenwave.ae", f"User {i}", "pw") for i in range(n)]
+
+
+# =======================
+# ATTENDEE REGISTRY
+# =======================
+
+def bench_attendee_registry(n):
+    system = Conference_system()
+    attendees = make_attendees(n)
+
+    def register():
+        for a in attendees:
+            system.add_attendee(a)
+
+    def lookup():
+        for i in range(0, n, 7):
+            system.lookup_attendee(f"USER{i}@greenwave.ae")
+
+    print(f"--- attendee registry, {n} attendees ---")
+    timed("register", register)
+    timed(f"lookup x{len(range(0, n, 7))}", lookup)
+
+
+# =======================
+# JOURNAL
+# =======================
+
+def bench_journal(n):
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            system = Conference_system(PickleStorage(compact_every=10 * n))
+            system.load_all_data()
+            system.create_default_exhibition()
+
+            print(f"--- journal, {n} attendees + passes + bookings ---")
+            latencies = []
+            for a in make_attendees(n):
+                start = time.perf_counter()
+                system.add_attendee(a)
+                system.issue_all_access_pass(a)
+                system.process_workshop_reservation(a, "Solar Futures")
+                latencies.append((time.perf_counter() - start) / 3)
+            system.storage.journal.flush()
+
+            latencies.sort()
+            print(f"{'per-operation write p50':<40} {latencies[len(latencies) // 2] * 1e6:8.1f} us")
+            print(f"{'per-operation write p99':<40} {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} us")
+
+            recovered = Conference_system()
+            timed(f"recover {len(system.storage.journal)} events", recovered.load_all_data)
+            timed("compact into snapshot", system.compact)
+            recovered = Conference_system()
+            timed("load compacted snapshot", recovered.load_all_data)
+
+            db = SQLiteStorage("bench.db")
+            timed("migrate to sqlite", db.rewrite, system)
+            recovered = Conference_system(db)
+            timed("load from sqlite", recovered.load_all_data)
+
+            latencies = []
+            for a in make_attendees(n // 10):
+                a.email = "new-" + a.email
+                start = time.perf_counter()
+                recovered.add_attendee(a)
+                recovered.issue_all_access_pass(a)
+                latencies.append((time.perf_counter() - start) / 2)
+            latencies.sort()
+            print(f"{'sqlite per-operation write p50':<40} {latencies[len(latencies) // 2] * 1e6:8.1f} us")
+            db.close()
+        finally:
+            os.chdir(old_dir)
+
+
+# =======================
+# LAZY STARTUP
+# =======================
+
+def bench_lazy_start(n):
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            system = Conference_system()
+            system.create_default_exhibition()
+            for a in make_attendees(n):
+                system.add_attendee(a)
+                system.issue_all_access_pass(a)
+            db = SQLiteStorage("bench.db")
+            db.rewrite(system)
+            db.close()
+
+            print(f"--- sqlite startup, {n} attendees ---")
+            for lazy in (False, True):
+                label = "lazy" if lazy else "eager"
+                system = Conference_system(SQLiteStorage("bench.db", lazy=lazy))
+                timed(label + " load_all_data", system.load_all_data)
+                timed(label + " first login", system.lookup_attendee, f"user{n // 2}@greenwave.ae")
+                system.storage.close()
+        finally:
+            os.chdir(old_dir)
+
+
+# =======================
+# DATA FILES
+# =======================
+
+def make_ticketed_system(n):
+    system = Conference_system()
+    system.create_default_exhibition()
+    exhibitions = system.exhibition_list
+    for i, a in enumerate(make_attendees(n)):
+        system.add_attendee(a)
+        if i % 2 == 0:
+            system.issue_all_access_pass(a)
+        else:
+            ex = exhibitions[i % 3]
+            system.issue_exhibition_pass(a, [ex.title], [ws.title for ws in ex.workshop_list])
+        for ws in exhibitions[i % 3].workshop_list[:2]:
+            ticket = a.ticket_for(ws.title)
+            if ticket is not None:
+                system._book(a, ws, ticket)
+    return system
+
+
+def bench_datafile(n):
+    system = make_ticketed_system(n)
+    data = {"attendees": system.attendee_list, "exhibitions": system.exhibition_list,
+            "sales": system.sales_list}
+
+    def pickle_save(filename, kind, items):
+        with open(filename, "wb") as f:
+            pickle.dump(items, f)
+
+    def pickle_load(filename, kind):
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            print(f"--- data files, {n} attendees ---")
+            for label, save, load in (("pickle", pickle_save, pickle_load),
+                                      ("datafile", datafile.save, datafile.load)):
+                timed(label + " save", lambda: [save(k + ".dat", k, v) for k, v in data.items()])
+                loaded = timed(label + " load", lambda: [load(k + ".dat", k) for k in data])
+                size = sum(os.path.getsize(k + ".dat") for k in data)
+                print(f"{label + ' size':<40} {size / 2**20:8.1f} MiB")
+                assert len(loaded[0]) == n
+        finally:
+            os.chdir(old_dir)
+
+
+def bench_kiosk_snapshot(n):
+    system = make_ticketed_system(n)
+    emails = [f"user{i}@greenwave.ae" for i in range(0, n, 7)]
+
+    def lookups(kiosk):
+        for email in emails:
+            kiosk.lookup_attendee(email)
+            kiosk._find_workshop("Smart Grids")
+
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            system.storage = PickleStorage()
+            system.store_all_data()
+            write_snapshot("catalog.snap", system.attendee_list, system.exhibition_list, system.sales_list)
+            del system
+
+            print(f"--- kiosk startup, {n} attendees ---")
+            for label, make_storage in (("data files", PickleStorage),
+                                        ("snapshot", SnapshotStorage)):
+                tracemalloc.start()
+                kiosk = Conference_system(make_storage())
+                timed(label + " load_all_data", kiosk.load_all_data)
+                timed(f"{label} lookup x{len(emails)}", lookups, kiosk)
+                used = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                print(f"{label + ' memory per kiosk':<40} {used / 2**20:8.1f} MiB")
+                kiosk.storage.close()
+                del kiosk
+        finally:
+            os.chdir(old_dir)
+
+
+# =======================
+# ADMIN SEARCH
+# =======================
+
+def bench_admin_search(n):
+    system = make_ticketed_system(n)
+    some_ticket = system.attendee_list[n // 2].owned_tickets[0].id_code
+    queries = [
+        ("email prefix", {"email_prefix": f"user{n // 3}"}),
+        ("name substring", {"name": f"er {n // 7}"}),
+        ("short name", {"name": "9"}),
+        ("ticket id", {"ticket_id": some_ticket}),
+        ("category, deep page", {"category": "All-Access Pass", "offset": n // 4}),
+        ("workshop", {"workshop": "Smart Grids"}),
+        ("category + workshop", {"category": "Single Exhibition Pass", "workshop": "Solar Futures"}),
+        ("email prefix + category", {"email_prefix": "user1", "category": "All-Access Pass"}),
+        ("broad prefix + category", {"email_prefix": "user", "category": "All-Access Pass"}),
+        ("broad prefix + name", {"email_prefix": "u", "name": "user"}),
+        ("name + workshop", {"name": "user", "workshop": "Smart Grids"}),
+        ("common name piece", {"name": "use"}),
+        ("one-letter name", {"name": "u"}),
+    ]
+
+    print(f"--- admin search, {n} attendees ---")
+    timed("build indexes", system.search_attendees)
+    for label, query in queries:
+        # one page, as the search screen fetches it, then the total
+        start = time.perf_counter()
+        system.search_attendees(count=False, **query)
+        page_time = time.perf_counter() - start
+        start = time.perf_counter()
+        page, total = system.search_attendees(**query)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<40} {page_time * 1e3:8.2f} ms  {elapsed * 1e3:8.2f} ms with total"
+              f"  {total:8d} matches")
+
+
+# =======================
+# CHECK-IN
+# =======================
+
+def bench_check_in(n):
+    system = make_ticketed_system(n)
+    ids = [a.owned_tickets[0].id_code for a in system.attendee_list[::max(1, n // 20_000)]]
+    scans = [(id_code, None) for id_code in ids]
+    # every other ticket at a workshop door, which only some of them booked
+    door_scans = [(id_code, "Smart Grids") for id_code in ids[::2]]
+
+    def scan_owners(id_codes):
+        for id_code in id_codes:
+            for a in system.attendee_list:
+                if system._find_owned_ticket(a, id_code) is not None:
+                    break
+
+    print(f"--- check-in, {n} attendees ---")
+    # the old way, on a few ids from across the list
+    few = ids[::max(1, len(ids) // 20)]
+    start = time.perf_counter()
+    scan_owners(few)
+    elapsed = time.perf_counter() - start
+    print(f"{'walk attendees':<40} {elapsed:8.3f} s  {len(few) / elapsed:10.0f} scans/s")
+
+    for label, batch in (("entrance", scans), ("workshop door", door_scans)):
+        start = time.perf_counter()
+        results = system.check_in_many(batch)
+        elapsed = time.perf_counter() - start
+        admitted = sum(1 for ok, msg in results if ok)
+        print(f"{label + ' scans':<40} {elapsed:8.3f} s  {len(batch) / elapsed:10.0f} scans/s"
+              f"  {admitted} admitted")
+    start = time.perf_counter()
+    for id_code, title in scans:
+        system.check_in(id_code, title)
+    elapsed = time.perf_counter() - start
+    print(f"{'repeat scans, one call each':<40} {elapsed:8.3f} s  {len(scans) / elapsed:10.0f} scans/s")
+
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_snapshot("catalog.snap", system.attendee_list, system.exhibition_list, system.sales_list)
+            kiosk = Conference_system(SnapshotStorage())
+            kiosk.load_all_data()
+            start = time.perf_counter()
+            results = kiosk.check_in_many(scans)
+            elapsed = time.perf_counter() - start
+            assert all(ok for ok, msg in results)
+            print(f"{'entrance scans, snapshot kiosk':<40} {elapsed:8.3f} s  {len(scans) / elapsed:10.0f} scans/s")
+            kiosk.storage.close()
+        finally:
+            os.chdir(old_dir)
+
+
+# =======================
+# SALES LEDGER
+# =======================
+
+def bench_sales_columns(n):
+    categories = ["All-Access Pass", "Single Exhibition Pass", "Dual Exhibition Pass", "Upgrade"]
+    amounts = [500.0, 50.0, 100.0, 50.0]
+    days = [f"2026-04-{d:02d}" for d in range(1, 31)]
+    sales_list = [(days[i % 30], categories[i % 4], amounts[i % 4]) for i in range(n)]
+
+    def list_report():
+        totals = {}
+        for d, ttype, amt in sales_list:
+            totals.setdefault(d, 0)
+            totals[d] += amt
+        return format_daily_report(totals)
+
+    print(f"--- sales ledger, {n} sales ---")
+    columns = timed("build columns", SalesColumns, sales_list)
+    expected = timed("list of tuples daily report", list_report)
+    report = timed("columnar daily report", lambda: format_daily_report(columns.daily_totals()))
+    timed("columnar category totals", columns.category_totals)
+    timed("columnar revenue over time", columns.revenue_over_time)
+    print(f"{'reports match':<40} {report == expected}")
+    column_bytes = sum(col.itemsize * len(col) for col in
+                       (columns.day_numbers, columns.category_codes, columns.amounts))
+    print(f"{'column bytes per sale':<40} {column_bytes / n:8.1f}")
+
+
+# =======================
+# MEMORY
+# =======================
+
+def bench_memory(n):
+    tracemalloc.start()
+    system = Conference_system()
+    system.create_default_exhibition()
+    exhibitions = system.exhibition_list
+    base = tracemalloc.get_traced_memory()[0]
+
+    for i, a in enumerate(make_attendees(n)):
+        system.add_attendee(a)
+        if i % 4 == 0:
+            system.issue_all_access_pass(a)
+        elif i % 4 != 3:
+            ex = exhibitions[i % 3]
+            system.issue_exhibition_pass(a, [ex.title], [ws.title for ws in ex.workshop_list])
+        # the fourth attendee has no ticket
+
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print(f"--- memory, {n} attendees with mixed tickets ---")
+    print(f"{'traced memory':<40} {used / 2**20:8.1f} MiB")
+    print(f"{'bytes per attendee':<40} {used / n:8.1f}")
+
+
+# =======================
+# CONCURRENT BOOKING
+# =======================
+
+def make_booking_system(workshops, capacity, attendees):
+    system = Conference_system()
+    ex = Exhibition("EXH1", "Stress Test")
+    for w in range(workshops):
+        # three-minute slots from 08:00 so the workshops never overlap
+        start = 8 * 60 + 3 * w
+        schedule = f"{start // 60:02d}:{start % 60:02d}-{(start + 3) // 60:02d}:{(start + 3) % 60:02d}"
+        ex.insert_workshop(Workshop(f"Workshop {w}", schedule, capacity))
+    system.add_exhibition(ex)
+    people = make_attendees(attendees)
+    for a in people:
+        system.add_attendee(a)
+        system.issue_all_access_pass(a)
+    return system, people
+
+
+def overbooking_problems(system):
+    """Returns a list of problems; empty when no workshop is overbooked."""
+    problems = []
+    for ws in system.catalog.workshops.values():
+        if len(ws.registered_attendees) > ws.max_capacity:
+            problems.append(ws.title + " overbooked")
+        for email in ws.registered_attendees:
+            if ws.title not in system.lookup_attendee(email).booked_workshops:
+                problems.append(f"{email} on the {ws.title} roster without the booking")
+    for a in system.attendee_list:
+        for title in a.booked_workshops:
+            if a.email not in system.catalog.find_workshop(title).registered_attendees:
+                problems.append(f"{a.email} booked {title} but is not on its roster")
+    return problems
+
+
+def check_no_overbooking(system):
+    # raised rather than asserted so the check still runs under python -O
+    problems = overbooking_problems(system)
+    if problems:
+        raise RuntimeError("; ".join(problems[:5]))
+
+
+def bench_concurrent_booking(attempts, thread_counts=(1, 2, 4, 8, 16)):
+    print(f"--- concurrent booking, {attempts} attempts ---")
+    for threads in thread_counts:
+        system, people = make_booking_system(200, 25, 10_000)
+        titles = list(system.catalog.workshops)
+        start_line = threading.Barrier(threads)
+        booked = [0] * threads
+
+        def worker(n):
+            rng = random.Random(n)
+            start_line.wait()
+            for _ in range(attempts // threads):
+                ok, msg = system.process_workshop_reservation(
+                    rng.choice(people), rng.choice(titles))
+                if ok:
+                    booked[n] += 1
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        check_no_overbooking(system)
+        seats = sum(len(ws.registered_attendees) for ws in system.catalog.workshops.values())
+        assert seats == sum(booked)
+        print(f"{threads:>2} threads: {attempts / elapsed:10.0f} bookings/s, "
+              f"{seats} seats taken of {200 * 25}, no overbooking")
+
+
+# =======================
+# SCHEDULE CONFLICTS
+# =======================
+
+def bench_schedule_conflicts(n):
+    system = Conference_system()
+    system.create_default_exhibition()
+    titles = list(system.catalog.workshops)
+    for ws in system.catalog.workshops.values():
+        ws.max_capacity = n
+    people = make_attendees(n)
+    for a in people:
+        system.add_attendee(a)
+        system.issue_all_access_pass(a)
+
+    def book():
+        for a in people:
+            for title in titles:
+                system.process_workshop_reservation(a, title)
+
+    print(f"--- schedule conflicts, {n} attendees x {len(titles)} workshops ---")
+    timed(f"checked bookings x{n * len(titles)}", book)
+    booked = sum(len(a.booked_workshops) for a in people)
+    print(f"{'bookings accepted':<40} {booked:8d}")
+
+    # the clashes a report has to find come from bookings made without the check
+    for a in people:
+        for title in titles:
+            a.add_booking(title)
+    found = timed(f"conflict report over {n * len(titles)} bookings",
+                  lambda: sum(1 for _ in system.schedule_conflicts()))
+    print(f"{'conflicts found':<40} {found:8d}")
+
+
+# =======================
+# WORKSHOP ACCESS
+# =======================
+
+def bench_workshop_access(n, exhibitions=10, per_exhibition=10):
+    system = Conference_system()
+    for e in range(exhibitions):
+        ex = Exhibition(f"EXH{e}", f"Exhibition {e}")
+        for w in range(per_exhibition):
+            ex.insert_workshop(Workshop(f"Workshop {e}.{w}", "10:00-11:00"))
+        system.add_exhibition(ex)
+    catalog = system.catalog
+    titles = list(catalog.workshops)
+    people = make_attendees(n)
+    for i, a in enumerate(people):
+        system.add_attendee(a)
+        # a few single-exhibition passes each, as a delegation buys them
+        for e in range(i % 4 + 1):
+            ex_title = f"Exhibition {(i + e) % exhibitions}"
+            system.issue_exhibition_pass(a, [ex_title], catalog.exhibition_workshops[ex_title])
+
+    def per_ticket():
+        return sum(1 for a in people for title in titles if a.can_book_workshop(title))
+
+    def bitmaps():
+        # what the booking screen does: the mask once, then a bit per row
+        count = 0
+        for a in people:
+            mask = system.workshop_access(a)
+            count += sum(1 for title in titles if system.workshop_allowed(mask, title))
+        return count
+
+    print(f"--- workshop access, {n} attendees x {len(titles)} workshops ---")
+    slow = timed("every screen row, per ticket", per_ticket)
+    system.access.clear()
+    timed("build access bitmaps", lambda: [system.access.mask(system._email_key(a.email), a)
+                                           for a in people])
+    fast = timed("every screen row, bitmaps", bitmaps)
+    assert slow == fast
+    timed("can_book_workshop calls", lambda: [system.can_book_workshop(a, title)
+                                              for a in people for title in titles])
+    timed("bookable workshops per attendee", lambda: [system.bookable_workshops(a) for a in people])
+
+
+# =======================
+# CANCELLATION
+# =======================
+
+def bench_cancellation(n):
+    system, people = make_booking_system(200, n, n)
+    titles = list(system.catalog.workshops)
+    for i, a in enumerate(people):
+        for k in range(5):
+            system.process_workshop_reservation(a, titles[(i + 40 * k) % 200])
+
+    def cancel_bookings():
+        for a in people[::2]:
+            system.cancel_booking(a, next(iter(a.booked_workshops)))
+
+    def cancel_tickets():
+        for a in people[1::2]:
+            system.cancel_ticket(a, a.owned_tickets[0].id_code)
+
+    print(f"--- cancellation, {n} attendees with 5 bookings each ---")
+    timed(f"cancel booking x{len(people[::2])}", cancel_bookings)
+    timed(f"cancel ticket + refund x{len(people[1::2])}", cancel_tickets)
+    problems = timed("check_invariants", system.check_invariants)
+    print(f"{'problems found':<40} {len(problems):8d}")
+
+
+# =======================
+# FSCK
+# =======================
+
+def bench_fsck(n):
+    system, people = make_booking_system(200, n, n)
+    titles = list(system.catalog.workshops)
+    for i, a in enumerate(people):
+        system.process_workshop_reservation(a, titles[i % 200])
+        system.process_workshop_reservation(a, titles[(i + 100) % 200])
+
+    print(f"--- fsck, {n} attendees with 2 bookings each ---")
+    problems = timed("verify clean data", verify, system)
+    print(f"{'problems found':<40} {len(problems):8d}")
+
+    # break one in a hundred attendees in a different way each
+    for i in range(0, n, 100):
+        a = people[i]
+        if i % 300 == 0:
+            a.add_booking("No Such Workshop")
+        elif i % 300 == 100:
+            system.catalog.workshops[titles[i % 200]].unregister(a.email)
+        else:
+            a.owned_tickets[0].id_code = people[0].owned_tickets[0].id_code
+    problems = timed("verify damaged data", verify, system)
+    print(f"{'problems found':<40} {len(problems):8d}")
+    changes = timed("repair", repair, system)
+    print(f"{'changes made':<40} {len(changes):8d}")
+    print(f"{'problems left':<40} {len(verify(system)):8d}")
+
+
+# =======================
+# TICKET IDS
+# =======================
+
+def take_ids(filename, block_size, count, results):
+    allocator = TicketIdAllocator(filename, block_size)
+    results.put([allocator.take() for _ in range(count)])
+
+
+def bench_ticket_ids(n, processes=4):
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            print(f"--- ticket ids, {n} per process ---")
+            for block_size in (1, 100, 1000):
+                count = n if block_size > 1 else n // 100
+                results = multiprocessing.Queue()
+                workers = [multiprocessing.Process(target=take_ids,
+                                                   args=(f"ids-{block_size}.dat", block_size, count, results))
+                           for _ in range(processes)]
+                start = time.perf_counter()
+                for w in workers:
+                    w.start()
+                numbers = [x for _ in workers for x in results.get()]
+                for w in workers:
+                    w.join()
+                elapsed = time.perf_counter() - start
+                assert len(set(numbers)) == len(numbers), "duplicate ticket numbers"
+                print(f"{processes} processes, blocks of {block_size:<5} "
+                      f"{len(numbers) / elapsed:12.0f} ids/s, all unique")
+
+            system = Conference_system(PickleStorage(compact_every=10 * n))
+            system.load_all_data()
+            system.create_default_exhibition()
+            attendees = make_attendees(n)
+            for a in attendees:
+                system.add_attendee(a)
+
+            def issue():
+                for a in attendees:
+                    system.issue_all_access_pass(a)
+
+            timed(f"issue {n} all-access passes", issue)
+            system.storage.close()
+        finally:
+            os.chdir(old_dir)
+
+
+# =======================
+# WAITLIST
+# =======================
+
+def bench_waitlist(n):
+    system, people = make_booking_system(1, 50, n)
+    title = "Workshop 0"
+
+    def join():
+        for a in people:
+            system.process_workshop_reservation(a, title, waitlist=True)
+
+    def churn():
+        # every seat holder cancels in turn; each cancellation hands the seat on
+        for _ in range(n // 2):
+            holder = system.lookup_attendee(next(iter(system.catalog.workshops[title].registered_attendees)))
+            system.cancel_booking(holder, title)
+
+    print(f"--- waitlist, {n} attendees for 50 seats ---")
+    timed(f"book or join waitlist x{n}", join)
+    timed(f"cancel + promote x{n // 2}", churn)
+    check_no_overbooking(system)
+    stats = system.waitlist_stats()[title]
+    print(f"{'queue depth left':<40} {stats['depth']:8d}")
+    print(f"{'promotions':<40} {stats['promoted']:8d}")
+    print(f"{'average / longest wait':<40} {stats['average_wait'] * 1e3:8.2f} / {stats['longest_wait'] * 1e3:.2f} ms")
+
+
+# =======================
+# HTTP SERVICE
+# =======================
+
+async def http_request(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load_generator(port, people, titles, requests, clients):
+    latencies = []
+
+    async def client(n):
+        rng = random.Random(n)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for i in range(requests // clients):
+            a = rng.choice(people)
+            roll = i % 10
+            start = time.perf_counter()
+            if roll < 6:
+                await http_request(reader, writer, "POST", "/bookings",
+                                   {"email": a.email, "password": "pw", "workshop": rng.choice(titles)})
+            elif roll < 9:
+                await http_request(reader, writer, "POST", "/login",
+                                   {"email": a.email, "password": "pw"})
+            else:
+                await http_request(reader, writer, "GET", "/reports/daily")
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def bench_http_service(requests, client_counts=(1, 8, 32)):
+    """60% bookings, 30% logins, 10% daily reports over keep-alive connections."""
+    print(f"--- http service, {requests} requests ---")
+    for clients in client_counts:
+        system, people = make_booking_system(200, 25, 10_000)
+        titles = list(system.catalog.workshops)
+        service = ConferenceService(system)
+
+        async def run():
+            server = await service.start("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await load_generator(port, people, titles, requests, clients)
+
+        latencies, elapsed = asyncio.run(run())
+        service.executor.shutdown()
+        check_no_overbooking(system)
+        latencies.sort()
+        print(f"{clients:>2} clients: {len(latencies) / elapsed:8.0f} req/s, "
+              f"p50 {latencies[len(latencies) // 2] * 1e3:6.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.2f} ms")
+
+
+# =======================
+# BULK IMPORT
+# =======================
+
+def write_delegation_csv(filename, n):
+    tickets = ["all-access", "Climate Tech Innovations",
+               "Policy & Community Action;Sustainable Lifestyles", ""]
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email", "full_name", "password", "ticket"])
+        for i in range(n):
+            # every 100th row is broken
+            email = f"delegate{i}@corp.ae" if i % 100 else f"delegate{i}-at-corp.ae"
+            writer.writerow([email, f"Delegate {i}", "pw", tickets[i % 4]])
+
+
+def bench_bulk_import(n):
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_delegation_csv("delegates.csv", n)
+            print(f"--- bulk import, {n} rows ---")
+            for label, storage in (("pickle journal", PickleStorage(compact_every=10 * n)),
+                                   ("sqlite", SQLiteStorage("bench.db"))):
+                system = Conference_system(storage)
+                system.load_all_data()
+                system.create_default_exhibition()
+                start = time.perf_counter()
+                report = import_file(system, "delegates.csv")
+                elapsed = time.perf_counter() - start
+                storage.close()
+                print(f"{label + ' import':<40} {elapsed:8.3f} s  {n / elapsed:10.0f} rows/s")
+                print(f"{'':<40} {report}")
+
+            system = Conference_system(PickleStorage("per-row.dat", compact_every=10 * n))
+            system.load_all_data()
+            system.create_default_exhibition()
+            start = time.perf_counter()
+            with open("delegates.csv", newline="") as f:
+                for row in csv.DictReader(f):
+                    a = Attendee(row["email"], row["full_name"], row["password"])
+                    if "@" not in a.email or not system.add_attendee(a):
+                        continue
+                    if row["ticket"] == "all-access":
+                        system.issue_all_access_pass(a)
+                    elif row["ticket"]:
+                        titles = row["ticket"].split(";")
+                        workshops = [w for t in titles for w in system.catalog.exhibition_workshops[t]]
+                        system.issue_exhibition_pass(a, titles, workshops)
+            elapsed = time.perf_counter() - start
+            system.storage.close()
+            print(f"{'one call per row (pickle journal)':<40} {elapsed:8.3f} s  {n / elapsed:10.0f} rows/s")
+        finally:
+            os.chdir(old_dir)
+
+
+# =======================
+# RUN
+# =======================
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        bench_attendee_registry(n)
+    for n in sizes:
+        if n <= 100_000:
+            bench_journal(n)
+            bench_lazy_start(n)
+    for n in sizes:
+        bench_datafile(n)
+        bench_kiosk_snapshot(n)
+    for n in sizes:
+        bench_sales_columns(n * 10)
+    for n in sizes:
+        if n <= 100_000:
+            bench_bulk_import(n)
+    for n in sizes:
+        bench_schedule_conflicts(n)
+    for n in sizes:
+        bench_workshop_access(n // 10)
+    for n in sizes:
+        bench_admin_search(n)
+    for n in sizes:
+        bench_check_in(n)
+    for n in sizes:
+        bench_cancellation(n)
+    for n in sizes:
+        bench_fsck(n)
+    for n in sizes:
+        if n <= 100_000:
+            bench_ticket_ids(n)
+    for n in sizes:
+        bench_memory(n)
+    bench_concurrent_booking(max(sizes) // 10)
+    bench_waitlist(min(max(sizes), 100_000))
+    bench_http_service(min(max(sizes) // 10, 20_000))
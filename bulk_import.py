@@ -0,0 +1,201 @@
+import argparse
+import csv
+import json
+import re
+from itertools import islice
+
+from data_classes import Conference_system, Attendee, ALL_WORKSHOPS
+from storage import SQLiteStorage
+
+
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+FIELDS = ("email", "full_name", "password", "ticket")
+
+
+# =======================
+# READING ROWS
+# =======================
+
+def read_rows(filename):
+    """
+    Yield (row number, dict) from a CSV file with a header line or from a
+    JSON Lines file (.jsonl / .ndjson), one row at a time.
+    The ticket column is empty, "all-access", or exhibition titles
+    separated by ";" (a JSON list works too).
+    """
+    if filename.endswith((".jsonl", ".ndjson")):
+        with open(filename, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield number, row if isinstance(row, dict) else None
+    else:
+        with open(filename, newline="", encoding="utf-8-sig") as f:
+            # row 1 is the header
+            for number, row in enumerate(csv.DictReader(f), 2):
+                yield number, row
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# =======================
+# VALIDATION
+# =======================
+
+def _text(row, name):
+    value = row.get(name)
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _ticket_titles(system, ticket):
+    """Turn the ticket column into what import_batch expects, or raise ValueError."""
+    if isinstance(ticket, str):
+        ticket = ticket.strip()
+        if ticket == "":
+            return None
+        if ticket.lower() in ("all-access", "all access", "all-access pass"):
+            return ALL_WORKSHOPS
+        ticket = [t.strip() for t in ticket.split(";") if t.strip()]
+    elif ticket is None:
+        return None
+    elif not isinstance(ticket, list):
+        raise ValueError("Ticket must be text or a list of exhibitions")
+
+    titles = []
+    for title in ticket:
+        if not isinstance(title, str):
+            raise ValueError("Exhibition must be text: " + repr(title))
+        ex = system.catalog.find_exhibition(title)
+        if ex is None:
+            raise ValueError("Exhibition not found: " + str(title))
+        if ex.title not in titles:
+            titles.append(ex.title)
+    # ";" or [] names no exhibition, so there is no pass to issue
+    if len(titles) == 0:
+        return None
+    return titles
+
+
+def validate_chunk(system, chunk):
+    """Split a chunk into import_batch entries and (row number, message) errors."""
+    entries = []
+    numbers = []
+    errors = []
+
+    rows = [row for number, row in chunk if row is not None]
+    emails = [_text(row, "email") for row in rows]
+    # one pass of the pattern over the whole chunk
+    valid = {e for e in emails if EMAIL_PATTERN.fullmatch(e)}
+
+    for number, row in chunk:
+        if row is None:
+            errors.append((number, "Row is not a JSON object"))
+            continue
+        email = _text(row, "email")
+        if email not in valid:
+            errors.append((number, "Invalid email: " + email))
+            continue
+
+        full_name = _text(row, "full_name")
+        password = _text(row, "password")
+        if full_name == "" or password == "":
+            errors.append((number, "Name and password are required"))
+            continue
+
+        try:
+            titles = _ticket_titles(system, row.get("ticket"))
+        except ValueError as e:
+            errors.append((number, str(e)))
+            continue
+
+        entries.append((Attendee(email, full_name, password), titles))
+        numbers.append(number)
+    return entries, numbers, errors
+
+
+# =======================
+# IMPORT
+# =======================
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.added = 0
+        self.existing = 0
+        self.tickets = 0
+        self.errors = []    # (row number, message)
+
+    def __str__(self):
+        return (f"{self.rows} rows: {self.added} attendees added, "
+                f"{self.existing} already registered, {self.tickets} tickets issued, "
+                f"{len(self.errors)} errors")
+
+
+def import_rows(system, rows, chunk_size=1000):
+    """
+    Import (row number, dict) pairs chunk by chunk. A bad row is recorded
+    in the report and skipped; the rest of the file still goes in.
+    """
+    report = ImportReport()
+    for chunk in chunked(rows, chunk_size):
+        report.rows += len(chunk)
+        entries, numbers, errors = validate_chunk(system, chunk)
+        report.errors.extend(errors)
+
+        for number, (attendee, ticket, added) in zip(numbers, system.import_batch(entries)):
+            if added:
+                report.added += 1
+            elif ticket is None:
+                report.errors.append((number, "Email already registered: " + attendee.email))
+                continue
+            else:
+                report.existing += 1
+            if ticket is not None:
+                report.tickets += 1
+
+    report.errors.sort()
+    return report
+
+
+def import_file(system, filename, chunk_size=1000):
+    return import_rows(system, read_rows(filename), chunk_size)
+
+
+# =======================
+# COMMAND LINE
+# =======================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import attendees and tickets")
+    parser.add_argument("file", help="CSV with a header line, or .jsonl")
+    parser.add_argument("--db", help="SQLite database (default: the .dat files)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--errors", help="write the rejected rows to this CSV file")
+    args = parser.parse_args()
+
+    system = Conference_system(SQLiteStorage(args.db) if args.db else None)
+    system.load_all_data()
+    system.create_default_exhibition()
+    report = import_file(system, args.file, args.chunk_size)
+    system.storage.close()
+
+    print(report)
+    if args.errors:
+        with open(args.errors, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "error"])
+            writer.writerows(report.errors)
+    else:
+        for number, message in report.errors[:20]:
+            print(f"  row {number}: {message}")
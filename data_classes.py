@@ -1,43 +1,458 @@
-import pickle
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
 from datetime import date
 
+from sales import SalesLedger, SalesColumns, format_daily_report
+from search import SearchIndex
+
+
+# =======================
+# PICKLE HELPERS
+# =======================
+
+# The model classes use __slots__. A slotted object pickles its state as
+# (None, {slot: value}), while pickles from before __slots__ hold a plain
+# __dict__. Both are accepted; missing attributes keep their defaults.
+def _restore_state(obj, state):
+    if isinstance(state, tuple):
+        dict_state, slot_state = state
+        state = dict(dict_state or {})
+        state.update(slot_state or {})
+    for name, value in state.items():
+        setattr(obj, name, value)
+
+
+def _slot_state(obj):
+    state = {}
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                state[name] = getattr(obj, name)
+    return state
+
+
+# workshop titles are interned so every ticket, booking and roster
+# shares one string object per title
+def _title_set(items):
+    return OrderedSet(sys.intern(t) for t in items)
+
+
+def ticket_number(id_code):
+    """The number at the end of a ticket id: "GW-EXH-0042" -> 42 (0 if none)."""
+    digits = id_code[len(id_code.rstrip("0123456789")):]
+    return int(digits) if digits else 0
+
+
+# =======================
+# ORDERED SET
+# =======================
+
+# set with O(1) membership that keeps insertion order for display
+class OrderedSet:
+    __slots__ = ("_items",)
+
+    def __init__(self, items=()):
+        self._items = dict.fromkeys(items)
+
+    def add(self, item):
+        self._items[item] = None
+
+    # lets older code that treated these collections as lists keep working
+    append = add
+
+    def remove(self, item):
+        del self._items[item]
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, (set, frozenset)):
+            return self._items.keys() == other
+        if isinstance(other, (OrderedSet, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __setstate__(self, state):
+        _restore_state(self, state)
+
+    def __repr__(self):
+        return "OrderedSet(" + repr(list(self._items)) + ")"
+
+
+# stands in for allowed_workshops on an All-Access Pass: every title is in it
+class _AllWorkshops:
+    __slots__ = ()
+
+    def __contains__(self, item):
+        return True
+
+    def __reduce__(self):
+        return "ALL_WORKSHOPS"
+
+    def __repr__(self):
+        return "ALL_WORKSHOPS"
+
+
+ALL_WORKSHOPS = _AllWorkshops()
+
+
 # =======================
 # EXHIBITION CLASS
 # =======================
 
 class Exhibition:
+    __slots__ = ("exhibition_id", "title", "workshop_list", "catalog")
+
     def __init__(self, exhibition_id="", title=""):
         self.exhibition_id = exhibition_id
         self.title = title
         self.workshop_list = []
+        self.catalog = None
 
     def insert_workshop(self, workshop):
         self.workshop_list.append(workshop)
+        if self.catalog is not None:
+            self.catalog.add_workshop(self, workshop)
 
     def delete_workshop(self, workshop):
         if workshop in self.workshop_list:
             self.workshop_list.remove(workshop)
+            if self.catalog is not None:
+                self.catalog.remove_workshop(self, workshop)
+
+    # the catalog belongs to the running system, so it is not pickled
+    def __getstate__(self):
+        state = _slot_state(self)
+        state["catalog"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.catalog = None
+        _restore_state(self, state)
+        self.catalog = None
 
     def __str__(self):
         return self.exhibition_id + "," + self.title + "," + str(len(self.workshop_list)) + " workshops"
 
 
+# =======================
+# SCHEDULES
+# =======================
+
+def _minutes(text):
+    hours, minutes = text.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_schedule(schedule):
+    """"10:00-11:00" -> (600, 660); None when the text is not a time range."""
+    try:
+        start, end = schedule.split("-")
+        start, end = _minutes(start), _minutes(end)
+    except (ValueError, AttributeError):
+        return None
+    if end <= start:
+        return None
+    return start, end
+
+
+class ScheduleIndex:
+    """
+    Each attendee's booked time slots, sorted by start time, so a new
+    booking finds a clash with a binary search instead of comparing
+    against every booking. An attendee's entry is built from
+    booked_workshops the first time it is needed and dropped whenever
+    bookings change outside claim(), so it never goes stale.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        # email key -> (slots, reach): slots are (start, end, title) sorted,
+        # reach[i] is the latest end among slots[:i + 1]; bookings made
+        # before clashes were checked can overlap, so the nearest
+        # neighbour alone is not enough
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def _entry(self, key, attendee):
+        entry = self.slots.get(key)
+        if entry is None:
+            slots = []
+            for title in attendee.booked_workshops:
+                interval = self.catalog.intervals.get(title)
+                if interval is not None:
+                    slots.append((interval[0], interval[1], title))
+            slots.sort()
+            entry = (slots, [])
+            self._extend_reach(entry, 0)
+            self.slots[key] = entry
+        return entry
+
+    def _extend_reach(self, entry, i):
+        slots, reach = entry
+        del reach[i:]
+        latest = reach[-1] if reach else 0
+        for slot in slots[i:]:
+            latest = max(latest, slot[1])
+            reach.append(latest)
+
+    def _clash(self, entry, start, end):
+        slots, reach = entry
+        i = bisect_left(slots, (end,))
+        if i == 0 or reach[i - 1] <= start:
+            return None
+        while slots[i - 1][1] <= start:
+            i -= 1
+        return slots[i - 1][2]
+
+    def _add(self, entry, start, end, title):
+        slot = (start, end, title)
+        i = bisect_left(entry[0], slot)
+        entry[0].insert(i, slot)
+        self._extend_reach(entry, i)
+        return i
+
+    def conflict(self, key, attendee, title):
+        """Title of a booked workshop that overlaps title, or None."""
+        interval = self.catalog.intervals.get(title)
+        if interval is None:
+            return None
+        with self.lock:
+            return self._clash(self._entry(key, attendee), interval[0], interval[1])
+
+    def claim(self, key, attendee, titles):
+        """
+        Check titles against the attendee's bookings and each other, and
+        take their slots if nothing overlaps. Returns {title: clashing title}.
+        """
+        with self.lock:
+            entry = self._entry(key, attendee)
+            added = []
+            lowest = len(entry[0])
+            clashes = {}
+            for title in titles:
+                interval = self.catalog.intervals.get(title)
+                if interval is None:
+                    continue
+                other = self._clash(entry, interval[0], interval[1])
+                if other is not None:
+                    clashes[title] = other
+                else:
+                    lowest = min(lowest, self._add(entry, interval[0], interval[1], title))
+                    added.append((interval[0], interval[1], title))
+            if len(clashes) > 0 and len(added) > 0:
+                # nothing is booked, so the slots taken above go again;
+                # the ones before the first of them were never touched
+                slots = entry[0]
+                for slot in added:
+                    del slots[bisect_left(slots, slot)]
+                self._extend_reach(entry, lowest)
+            return clashes
+
+    def forget(self, key):
+        with self.lock:
+            self.slots.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.slots = {}
+
+
+# =======================
+# ACCESS
+# =======================
+
+class AccessIndex:
+    """
+    Each attendee's access over all their tickets as one int with a bit
+    per workshop (Catalog.workshop_bits), so "may book this" is a single
+    bit test. An All-Access pass gives -1, every bit set, which also
+    covers workshops added later. An entry is built on first use, gains
+    bits when a ticket is issued or upgraded and is dropped when a
+    ticket goes.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.masks = {}             # email key -> access bits
+        self.lock = threading.Lock()
+
+    def ticket_mask(self, ticket):
+        if ticket.allowed_workshops is ALL_WORKSHOPS:
+            return -1
+        return self.catalog.title_mask(ticket.allowed_workshops)
+
+    def mask(self, key, attendee):
+        mask = self.masks.get(key)
+        if mask is not None:
+            return mask
+        with self.lock:
+            mask = self.masks.get(key)
+            if mask is None:
+                mask = 0
+                for ticket in attendee.owned_tickets:
+                    mask |= self.ticket_mask(ticket)
+                self.masks[key] = mask
+            return mask
+
+    def grant(self, key, mask):
+        with self.lock:
+            if key in self.masks:
+                self.masks[key] |= mask
+
+    def forget(self, key):
+        with self.lock:
+            self.masks.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.masks = {}
+
+
+def conflict_report(attendees, intervals):
+    """
+    Yield (email, title, overlapping title) for every pair of booked
+    workshops that overlap, in one sort-and-sweep per attendee.
+    """
+    for attendee in attendees:
+        if len(attendee.booked_workshops) < 2:
+            continue
+        slots = []
+        for title in attendee.booked_workshops:
+            interval = intervals.get(title)
+            if interval is not None:
+                slots.append((interval[0], interval[1], title))
+        slots.sort()
+
+        active = []     # slots still running at the current start time
+        for start, end, title in slots:
+            active = [s for s in active if s[1] > start]
+            for other in active:
+                yield attendee.email, other[2], title
+            active.append((start, end, title))
+
+
+# =======================
+# CATALOG CLASS
+# =======================
+
+class Catalog:
+    def __init__(self):
+        self.workshops = {}               # workshop title -> Workshop
+        self.exhibitions = {}             # exhibition title -> Exhibition
+        self.exhibition_workshops = {}    # exhibition title -> [workshop titles]
+        self.all_workshop_titles = OrderedSet()
+        self.intervals = {}               # workshop title -> (start, end) in minutes
+        # workshop title -> bit number for access masks; a number is never
+        # reused, so a title that comes back gets its old bit
+        self.workshop_bits = {}
+        self.bit_titles = []              # bit number -> workshop title
+        self.workshop_mask = 0            # bits of the workshops there are now
+        # access masks are worked out on booking threads, so two of them
+        # may meet a new title at once
+        self.bits_lock = threading.Lock()
+
+    def add_exhibition(self, exhibition):
+        exhibition.catalog = self
+        self.exhibitions[exhibition.title] = exhibition
+        self.exhibition_workshops[exhibition.title] = []
+        for ws in exhibition.workshop_list:
+            self.add_workshop(exhibition, ws)
+
+    def add_workshop(self, exhibition, workshop):
+        self.exhibition_workshops[exhibition.title].append(workshop.title)
+        if workshop.title not in self.workshops:
+            self.workshops[workshop.title] = workshop
+            self.all_workshop_titles.add(workshop.title)
+            self.intervals[workshop.title] = parse_schedule(workshop.schedule)
+            self.workshop_mask |= 1 << self.title_bit(workshop.title)
+
+    def remove_workshop(self, exhibition, workshop):
+        titles = self.exhibition_workshops[exhibition.title]
+        if workshop.title in titles:
+            titles.remove(workshop.title)
+        if self.workshops.get(workshop.title) is not workshop:
+            return
+
+        # another exhibition may still hold a workshop with the same title
+        for ex in self.exhibitions.values():
+            for ws in ex.workshop_list:
+                if ws.title == workshop.title:
+                    self.workshops[ws.title] = ws
+                    self.intervals[ws.title] = parse_schedule(ws.schedule)
+                    return
+
+        del self.workshops[workshop.title]
+        del self.intervals[workshop.title]
+        self.all_workshop_titles.remove(workshop.title)
+        self.workshop_mask &= ~(1 << self.workshop_bits[workshop.title])
+
+    def title_bit(self, title):
+        bit = self.workshop_bits.get(title)
+        if bit is None:
+            with self.bits_lock:
+                bit = self.workshop_bits.get(title)
+                if bit is None:
+                    bit = len(self.bit_titles)
+                    self.bit_titles.append(title)
+                    self.workshop_bits[title] = bit
+        return bit
+
+    def title_mask(self, titles):
+        mask = 0
+        for title in titles:
+            mask |= 1 << self.title_bit(title)
+        return mask
+
+    def mask_titles(self, mask):
+        """Titles of the workshops there are now whose bits are set in mask."""
+        mask &= self.workshop_mask
+        titles = []
+        while mask:
+            low = mask & -mask
+            titles.append(self.bit_titles[low.bit_length() - 1])
+            mask ^= low
+        return titles
+
+    def find_workshop(self, title):
+        return self.workshops.get(title)
+
+    def find_exhibition(self, title):
+        return self.exhibitions.get(title)
+
+
 # =======================
 # WORKSHOP CLASS
 # =======================
 
 class Workshop:
+    __slots__ = ("title", "schedule", "max_capacity", "registered_attendees")
+
     def __init__(self, title="", schedule="", max_capacity=30):
-        self.title = title
+        self.title = sys.intern(title)
         self.schedule = schedule
         self.max_capacity = max_capacity
-        self.registered_attendees = []
+        self.registered_attendees = OrderedSet()
 
     def register(self, attendee_email):
         if len(self.registered_attendees) >= self.max_capacity:
             return False
         if attendee_email not in self.registered_attendees:
-            self.registered_attendees.append(attendee_email)
+            self.registered_attendees.add(attendee_email)
             return True
         return False
 
@@ -47,6 +462,12 @@ class Workshop:
             return True
         return False
 
+    def __setstate__(self, state):
+        _restore_state(self, state)
+        self.title = sys.intern(self.title)
+        if not isinstance(self.registered_attendees, OrderedSet):
+            self.registered_attendees = OrderedSet(self.registered_attendees)
+
     def get_available_spots(self):
         return self.max_capacity - len(self.registered_attendees)
 
@@ -57,22 +478,120 @@ class Workshop:
         return self.title + "," + self.schedule + "," + str(len(self.registered_attendees)) + "/" + str(self.max_capacity)
 
 
+# =======================
+# WAITLIST CLASS
+# =======================
+
+class Waitlist:
+    """
+    People waiting for a seat in one full workshop. All-Access pass holders
+    are served before everyone else, first come first served within each
+    group. Leaving the list only forgets the email; the stale queue entry
+    is skipped when it reaches the front, so every operation is O(1).
+
+    Waitlists live in memory only: joining and leaving are not journaled
+    and no storage writes them, so a restart starts every list empty.
+    Seats handed out from a list are journaled as ordinary bookings.
+    """
+
+    def __init__(self):
+        self.priority = deque()
+        self.regular = deque()
+        self.waiting = {}           # email -> (time it joined, priority)
+        self.priority_count = 0
+        self.promoted = 0
+        self.passed_over = 0
+        self.total_wait = 0.0
+        self.longest_wait = 0.0
+
+    def add(self, attendee_email, priority=False):
+        """Join the line; returns the place in it, or 0 if already waiting."""
+        if attendee_email in self.waiting:
+            return 0
+        # the join time also tells a live entry from a stale one left by
+        # someone who left and joined again
+        entry = (attendee_email, time.monotonic())
+        self.waiting[attendee_email] = (entry[1], priority)
+        if priority:
+            self.priority.append(entry)
+            self.priority_count += 1
+            return self.priority_count
+        self.regular.append(entry)
+        return len(self.waiting)
+
+    def remove(self, attendee_email):
+        state = self.waiting.pop(attendee_email, None)
+        if state is None:
+            return False
+        if state[1]:
+            self.priority_count -= 1
+        return True
+
+    def pop(self, take=None):
+        """
+        Next email in line, or None when nobody is waiting. When given,
+        take(email) decides whether that person gets the seat; anyone it
+        turns down keeps their place for the next one.
+        """
+        for queue in (self.priority, self.regular):
+            passed = []
+            try:
+                while len(queue) > 0:
+                    entry = queue.popleft()
+                    email, joined = entry
+                    state = self.waiting.get(email)
+                    if state is None or state[0] != joined:
+                        continue
+                    if take is not None and not take(email):
+                        # take may also have struck them off the list
+                        if email in self.waiting:
+                            passed.append(entry)
+                            self.passed_over += 1
+                        continue
+                    self.remove(email)
+                    waited = time.monotonic() - joined
+                    self.promoted += 1
+                    self.total_wait += waited
+                    self.longest_wait = max(self.longest_wait, waited)
+                    return email
+            finally:
+                queue.extendleft(reversed(passed))
+        return None
+
+    def __contains__(self, attendee_email):
+        return attendee_email in self.waiting
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def stats(self):
+        return {
+            "depth": len(self.waiting),
+            "promoted": self.promoted,
+            "passed_over": self.passed_over,
+            "average_wait": self.total_wait / self.promoted if self.promoted else 0.0,
+            "longest_wait": self.longest_wait,
+        }
+
+
 # =======================
 # TICKET CLASS
 # =======================
 
 class Ticket:
+    __slots__ = ("id_code", "cost", "category", "allowed_workshops",
+                 "current_bookings", "purchase_date")
+
     def __init__(self, id_code="", cost=0.0, category=""):
         self.id_code = id_code
         self.cost = cost
         self.category = category
-        self.allowed_workshops = []
-        self.current_bookings = []
+        self.allowed_workshops = OrderedSet()
+        self.current_bookings = OrderedSet()
         self.purchase_date = ""
 
     def remove_allowed_workshop(self, workshop_title):
-        if workshop_title in self.allowed_workshops:
-            self.allowed_workshops.remove(workshop_title)
+        self.allowed_workshops.discard(workshop_title)
 
     def remove_booking(self, workshop_title):
         if workshop_title in self.current_bookings:
@@ -81,12 +600,18 @@ class Ticket:
         return False
 
     def add_booking(self, workshop_title):
-        if workshop_title not in self.current_bookings:
-            self.current_bookings.append(workshop_title)
+        self.current_bookings.add(sys.intern(workshop_title))
 
     def can_access_workshop(self, workshop_title):
         return workshop_title in self.allowed_workshops
 
+    # also turns the plain lists of pickles from before OrderedSet into sets
+    def __setstate__(self, state):
+        self.__init__()
+        _restore_state(self, state)
+        self.allowed_workshops = _title_set(self.allowed_workshops)
+        self.current_bookings = _title_set(self.current_bookings)
+
     def __str__(self):
         return self.id_code + "," + self.category + "," + str(self.cost) + " AED"
 
@@ -96,6 +621,8 @@ class Ticket:
 # =======================
 
 class ExhibitionPass(Ticket):
+    __slots__ = ("exhibitions",)
+
     def __init__(self, id_code="", exhibitions_list=None):
         Ticket.__init__(self)
         self.id_code = id_code
@@ -114,8 +641,7 @@ class ExhibitionPass(Ticket):
         if exhibition_title not in self.exhibitions:
             self.exhibitions.append(exhibition_title)
             for ws in workshops:
-                if ws not in self.allowed_workshops:
-                    self.allowed_workshops.append(ws)
+                self.allowed_workshops.add(sys.intern(ws))
             self.cost = len(self.exhibitions) * 50.0
 
     def __str__(self):
@@ -127,11 +653,25 @@ class ExhibitionPass(Ticket):
 # =======================
 
 class AllAccessPass(Ticket):
+    __slots__ = ()
+
     def __init__(self, id_code=""):
         Ticket.__init__(self)
         self.id_code = id_code
         self.cost = 500.0
         self.category = "All-Access Pass"
+        self.allowed_workshops = ALL_WORKSHOPS
+
+    def remove_allowed_workshop(self, workshop_title):
+        # access is "all", including workshops added later, so there is no list to edit
+        pass
+
+    def __setstate__(self, state):
+        self.__init__()
+        _restore_state(self, state)
+        self.current_bookings = _title_set(self.current_bookings)
+        # older pickles hold a copy of every title instead
+        self.allowed_workshops = ALL_WORKSHOPS
 
     def __str__(self):
         return self.id_code + "," + self.category + "," + str(self.cost) + " AED"
@@ -142,19 +682,23 @@ class AllAccessPass(Ticket):
 # =======================
 
 class Attendee:
+    # __weakref__ lets the lazy storages keep one live object per attendee
+    __slots__ = ("email", "full_name", "password", "owned_tickets", "booked_workshops",
+                 "__weakref__")
+
     def __init__(self, email="", full_name="", password=""):
         self.email = email
         self.full_name = full_name
         self.password = password
         self.owned_tickets = []
-        self.booked_workshops = []
+        self.booked_workshops = OrderedSet()
 
     def assign_ticket(self, ticket):
         self.owned_tickets.append(ticket)
 
     def add_booking(self, workshop_title):
         if workshop_title not in self.booked_workshops:
-            self.booked_workshops.append(workshop_title)
+            self.booked_workshops.add(sys.intern(workshop_title))
             return True
         return False
 
@@ -165,52 +709,236 @@ class Attendee:
         return False
 
     def can_book_workshop(self, workshop_title):
+        return self.ticket_for(workshop_title) is not None
+
+    def ticket_for(self, workshop_title):
+        """The first owned ticket that gives access to the workshop."""
         for ticket in self.owned_tickets:
             if ticket.can_access_workshop(workshop_title):
-                return True
-        return False
+                return ticket
+        return None
 
     def verify_password(self, password):
         return self.password == password
 
+    def __setstate__(self, state):
+        self.__init__()
+        _restore_state(self, state)
+        self.booked_workshops = _title_set(self.booked_workshops)
+
     def __str__(self):
         return self.email + "," + self.full_name + "," + str(len(self.owned_tickets)) + " tickets"
 
 
 # =======================
-# CONFERENCE SYSTEM (WITH PICKLE)
+# STATE GATE
 # =======================
 
-class Conference_system:
+class StateGate:
+    """
+    Lets any number of operations change the system at the same time,
+    but gives store_all_data the whole state to itself while it writes
+    a snapshot (a readers/writer lock with the roles swapped).
+    """
+
     def __init__(self):
+        self.cond = threading.Condition()
+        self.active = 0
+        self.closed = False
+
+    @contextmanager
+    def operation(self):
+        with self.cond:
+            while self.closed:
+                self.cond.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                if self.active == 0:
+                    self.cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self.cond:
+            while self.closed:
+                self.cond.wait()
+            self.closed = True
+            while self.active > 0:
+                self.cond.wait()
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.closed = False
+                self.cond.notify_all()
+
+
+# =======================
+# CONFERENCE SYSTEM
+# =======================
+
+class Conference_system:
+    def __init__(self, storage=None):
         self.attendee_list = []
         self.exhibition_list = []
         self.ticket_counter = 0
-        self.sales_list = []
+        self.sales_list = SalesColumns()
+        # running totals over sales_list for the reports
+        self.sales = SalesLedger()
+        # email (lower case) -> Attendee, so login does not scan the list
+        self.attendee_index = {}
+        self.catalog = Catalog()
+        # booked time slots per attendee, for clash checks
+        self.schedules = ScheduleIndex(self.catalog)
+        # workshop access per attendee, as bits
+        self.access = AccessIndex(self.catalog)
+        # admin search; built on the first search
+        self.search = SearchIndex()
+        # ticket id -> (ticket, attendee), so scans and upgrades do not
+        # walk every attendee's tickets
+        self.ticket_registry = {}
+        # (ticket id, workshop title or "") -> time of the scan
+        self.check_ins = {}
+        if storage is None:
+            # imported here because storage.py imports the model classes
+            from storage import PickleStorage
+            storage = PickleStorage()
+        self.storage = storage
+        # events are only recorded once load_all_data has attached the
+        # storage, so a system that was never loaded stays purely in memory
+        self.recording = False
+
+        # there is no single big lock: bookings lock only their workshop,
+        # and the few shared counters have small locks of their own
+        self.gate = StateGate()
+        self.workshop_locks = {}
+        self.workshop_locks_guard = threading.Lock()
+        # workshop title -> Waitlist, only touched under that workshop's
+        # lock; kept in memory only, see Waitlist
+        self.waitlists = {}
+        self.attendee_lock = threading.Lock()
+        self.ticket_lock = threading.Lock()
+        self.sales_lock = threading.Lock()
+        self.upgrade_lock = threading.Lock()
+        self.check_in_lock = threading.Lock()
+
+    # ------------ SAVE/LOAD ------------
 
-    # ------------ PICKLE SAVE/LOAD ------------
+    def load_all_data(self):
+        self.recording = False
+        self.search.clear()
+        events = self.storage.load(self)
+        # a lazy storage supplies its own index and loads attendees on demand
+        if not self.storage.lazy:
+            self._rebuild_attendee_index()
+        self._rebuild_ticket_registry()
+        self._rebuild_catalog()
+        # older sales.dat files and the SQLite rows give a list of tuples
+        if not isinstance(self.sales_list, SalesColumns):
+            self.sales_list = SalesColumns(self.sales_list)
+        self.sales.rebuild(self.sales_list)
+
+        # replay whatever happened after the last snapshot
+        for event in events:
+            self._apply_event(event)
+        self.ticket_counter = self._derive_ticket_counter()
+        # data written before the allocator existed may hold higher numbers
+        self.storage.ticket_ids.advance_to(self.ticket_counter)
+        self.recording = True
 
-    def _save_file(self, filename, data):
-        with open(filename, "wb") as f:
-            pickle.dump(data, f)
+    def store_all_data(self):
+        with self.gate.exclusive():
+            self.storage.store(self)
+
+    def compact(self):
+        self.store_all_data()
+
+    def autosave(self):
+        """
+        Make everything done so far durable without a full save: pending
+        journal events are written out, and the snapshot is rewritten only
+        once the journal is due for compacting.
+        """
+        if not self.recording:
+            return
+        if self.storage.compact_due():
+            self.compact()
+        else:
+            self.storage.flush()
 
-    def _load_file(self, filename):
-        try:
-            with open(filename, "rb") as f:
-                return pickle.load(f)
-        except:
-            return []
+    # ------------ JOURNAL ------------
 
-    def load_all_data(self):
-        self.attendee_list = self._load_file("attendees.dat")
-        self.exhibition_list = self._load_file("exhibitions.dat")
-        self.sales_list = self._load_file("sales.dat")
-        self.ticket_counter = len(self.sales_list)
+    def _log(self, event):
+        if self.recording:
+            self.storage.record(self, event)
 
-    def store_all_data(self):
-        self._save_file("attendees.dat", self.attendee_list)
-        self._save_file("exhibitions.dat", self.exhibition_list)
-        self._save_file("sales.dat", self.sales_list)
+    def _log_many(self, events):
+        if self.recording and len(events) > 0:
+            self.storage.record_many(self, events)
+
+    # called after an operation has left the gate, since compacting
+    # needs the state to itself
+    def _compact_if_due(self):
+        if self.recording and self.storage.compact_due():
+            self.compact()
+
+    def _find_owned_ticket(self, attendee, id_code):
+        for t in attendee.owned_tickets:
+            if t.id_code == id_code:
+                return t
+        return None
+
+    def _ticket_from_event(self, event):
+        email, ticket_type, id_code, exhibitions, workshops, purchase_date = event[1:]
+        if ticket_type == "All-Access Pass":
+            ticket = AllAccessPass(id_code)
+        else:
+            ticket = ExhibitionPass(id_code, list(exhibitions))
+            ticket.allowed_workshops = _title_set(workshops)
+        ticket.purchase_date = purchase_date
+        return ticket
+
+    # the storage hands back only the events the snapshot does not hold,
+    # so each one is applied as it happened; only a workshop the admin
+    # has since deleted is skipped
+    def _apply_event(self, event):
+        kind = event[0]
+
+        if kind == "default_exhibitions_created":
+            self.create_default_exhibition()
+            return
+
+        attendee = self.lookup_attendee(event[1])
+
+        if kind == "attendee_added":
+            self.add_attendee(Attendee(event[1], event[2], event[3]))
+
+        elif kind == "ticket_issued":
+            self._add_ticket(attendee, self._ticket_from_event(event))
+
+        elif kind == "booking_made":
+            ws = self._find_workshop(event[2])
+            if ws is not None:
+                self._book(attendee, ws, attendee.ticket_for(event[2]))
+                self.schedules.forget(self._email_key(attendee.email))
+
+        elif kind == "booking_cancelled":
+            ws = self._find_workshop(event[2])
+            if ws is not None:
+                self._unbook(attendee, ws)
+
+        elif kind == "ticket_cancelled":
+            email, id_code, day, refund, dropped = event[1:]
+            self._drop_ticket(attendee, self._find_owned_ticket(attendee, id_code), dropped)
+            self._record_sale(day, "Refund", -refund)
+
+        elif kind == "upgrade_applied":
+            email, id_code, exhibition_title, day = event[1:]
+            ticket = self._find_owned_ticket(attendee, id_code)
+            self._apply_upgrade(attendee, ticket, exhibition_title, day)
 
     # ------------ DEFAULT EXHIBITIONS ------------
 
@@ -234,93 +962,583 @@ class Conference_system:
         ex3.insert_workshop(Workshop("Mindful Consumption", "13:00-14:00"))
 
         self.exhibition_list = [ex1, ex2, ex3]
+        self._rebuild_catalog()
+        self._log(("default_exhibitions_created",))
+
+    def _rebuild_catalog(self):
+        self.catalog = Catalog()
+        for ex in self.exhibition_list:
+            self.catalog.add_exhibition(ex)
+        self.schedules = ScheduleIndex(self.catalog)
+        self.access = AccessIndex(self.catalog)
+
+    def add_exhibition(self, exhibition):
+        self.exhibition_list.append(exhibition)
+        self.catalog.add_exhibition(exhibition)
 
     # ------------ ATTENDEE ------------
 
-    def add_attendee(self, attendee):
+    def _email_key(self, email):
+        key = email.strip().lower()
+        # reuse the attendee's own string when it is already normalised
+        return email if key == email else key
+
+    def _rebuild_attendee_index(self):
+        self.attendee_index = {}
         for a in self.attendee_list:
-            if a.email == attendee.email:
+            self.attendee_index.setdefault(self._email_key(a.email), a)
+
+    def add_attendee(self, attendee):
+        key = self._email_key(attendee.email)
+        with self.gate.operation(), self.storage.transaction(self), self.attendee_lock:
+            if key in self.attendee_index:
                 return False
-        self.attendee_list.append(attendee)
+            self.attendee_list.append(attendee)
+            self.attendee_index[key] = attendee
+            self.search.add(key, attendee)
+            self._log(("attendee_added", attendee.email, attendee.full_name, attendee.password))
+        self._compact_if_due()
         return True
 
     def lookup_attendee(self, email):
-        for a in self.attendee_list:
-            if a.email == email:
-                return a
-        return None
+        return self.attendee_index.get(self._email_key(email))
 
     # ------------ TICKET CREATION ------------
 
     def _next_ticket_id(self, prefix):
-        self.ticket_counter += 1
-        return f"{prefix}-{self.ticket_counter:04d}"
+        return f"{prefix}-{self._reserve_ticket_numbers(1):04d}"
+
+    def _highest_ticket_number(self):
+        highest = 0
+        for attendee in self.attendee_list:
+            for ticket in attendee.owned_tickets:
+                highest = max(highest, ticket_number(ticket.id_code))
+        return highest
+
+    def _derive_ticket_counter(self):
+        # each ticket sale took one number and upgrades and refunds took
+        # none, so this still counts cancelled tickets; files from before
+        # that rule numbered upgrades too, which the highest id covers
+        sold = (len(self.sales_list) - self.sales_list.count("Upgrade")
+                - self.sales_list.count("Refund"))
+        # a lazy storage has not loaded the tickets, so it is asked directly
+        if self.storage.lazy:
+            highest = self.storage.highest_ticket_number()
+        else:
+            highest = self._highest_ticket_number()
+        return max(sold, highest)
+
+    def _reserve_ticket_numbers(self, count):
+        """Take count consecutive ticket numbers in one go; returns the first of them."""
+        with self.ticket_lock:
+            # once loaded, numbers come from the storage's allocator so other
+            # processes on the same data never get the same ones
+            if self.recording:
+                first = self.storage.ticket_ids.take(count)
+            else:
+                first = self.ticket_counter + 1
+            self.ticket_counter = max(self.ticket_counter, first + count - 1)
+            return first
+
+    def _rebuild_ticket_registry(self):
+        self.ticket_registry = {}
+        # a lazy storage is asked for the owner of tickets it has not loaded
+        if self.storage.lazy:
+            return
+        for a in self.attendee_list:
+            for ticket in a.owned_tickets:
+                self.ticket_registry[ticket.id_code] = (ticket, a)
 
-    def issue_exhibition_pass(self, attendee, exhibition_titles, workshop_titles):
-        ticket_id = self._next_ticket_id("GW-EXH")
-        ticket = ExhibitionPass(ticket_id, exhibition_titles)
-        ticket.allowed_workshops = workshop_titles
-        ticket.purchase_date = date.today().isoformat()
+    def _add_ticket(self, attendee, ticket):
         attendee.assign_ticket(ticket)
-        self.sales_list.append((ticket.purchase_date, ticket.category, ticket.cost))
-        return ticket
+        self.ticket_registry[ticket.id_code] = (ticket, attendee)
+        key = self._email_key(attendee.email)
+        self.access.grant(key, self.access.ticket_mask(ticket))
+        self.search.tickets_changed(key, attendee)
+        self._record_sale(ticket.purchase_date, ticket.category, ticket.cost)
 
-    def issue_all_access_pass(self, attendee):
-        ticket_id = self._next_ticket_id("GW-ALL")
-        ticket = AllAccessPass(ticket_id)
+    def _record_sale(self, day, category, amount):
+        with self.sales_lock:
+            self.sales_list.append((day, category, amount))
+            self.sales.add(day, category, amount)
 
-        for ex in self.exhibition_list:
-            for ws in ex.workshop_list:
-                if ws.title not in ticket.allowed_workshops:
-                    ticket.allowed_workshops.append(ws.title)
+    def _ticket_event(self, attendee, ticket, exhibitions, workshops):
+        return ("ticket_issued", attendee.email, ticket.category, ticket.id_code,
+                exhibitions, workshops, ticket.purchase_date)
 
-        ticket.purchase_date = date.today().isoformat()
-        attendee.assign_ticket(ticket)
-        self.sales_list.append((ticket.purchase_date, ticket.category, ticket.cost))
+    def _log_ticket(self, attendee, ticket, exhibitions, workshops):
+        self._log(self._ticket_event(attendee, ticket, exhibitions, workshops))
+
+    def issue_exhibition_pass(self, attendee, exhibition_titles, workshop_titles):
+        with self.gate.operation(), self.storage.transaction(self):
+            ticket_id = self._next_ticket_id("GW-EXH")
+            ticket = ExhibitionPass(ticket_id, exhibition_titles)
+            ticket.allowed_workshops = _title_set(workshop_titles)
+            ticket.purchase_date = date.today().isoformat()
+            self._add_ticket(attendee, ticket)
+            self._log_ticket(attendee, ticket, list(exhibition_titles), list(workshop_titles))
+        self._compact_if_due()
         return ticket
 
+    def issue_all_access_pass(self, attendee):
+        with self.gate.operation(), self.storage.transaction(self):
+            ticket_id = self._next_ticket_id("GW-ALL")
+            ticket = AllAccessPass(ticket_id)
+            ticket.purchase_date = date.today().isoformat()
+            self._add_ticket(attendee, ticket)
+            self._log_ticket(attendee, ticket, [], [])
+        self._compact_if_due()
+        return ticket
+
+    # ------------ BULK IMPORT ------------
+
+    def import_batch(self, entries):
+        """
+        Add a batch of attendees and their tickets. Each entry is
+        (attendee, exhibition_titles) where exhibition_titles is None for
+        no ticket, ALL_WORKSHOPS for an All-Access pass or a list of titles.
+        An attendee whose email is already known is not added again; the
+        ticket goes to the existing one. The tickets get consecutive ids and
+        the whole batch is written to storage at once.
+        Returns [(attendee, ticket or None, added)] in entry order.
+        """
+        results = []
+        events = []
+        with self.gate.operation(), self.storage.transaction(self):
+            with self.attendee_lock:
+                for attendee, exhibition_titles in entries:
+                    key = self._email_key(attendee.email)
+                    existing = self.attendee_index.get(key)
+                    if existing is None:
+                        self.attendee_list.append(attendee)
+                        self.attendee_index[key] = attendee
+                        self.search.add(key, attendee)
+                        events.append(("attendee_added", attendee.email,
+                                       attendee.full_name, attendee.password))
+                        results.append((attendee, exhibition_titles, True))
+                    else:
+                        results.append((existing, exhibition_titles, False))
+
+            count = sum(1 for r in results if r[1] is not None)
+            number = self._reserve_ticket_numbers(count)
+            today = date.today().isoformat()
+            for i, (attendee, exhibition_titles, added) in enumerate(results):
+                if exhibition_titles is None:
+                    continue
+
+                exhibitions = []
+                workshop_titles = []
+                if exhibition_titles is ALL_WORKSHOPS:
+                    ticket = AllAccessPass(f"GW-ALL-{number:04d}")
+                else:
+                    exhibitions = list(exhibition_titles)
+                    ticket = ExhibitionPass(f"GW-EXH-{number:04d}", list(exhibitions))
+                    for title in exhibitions:
+                        workshop_titles.extend(self.catalog.exhibition_workshops[title])
+                    ticket.allowed_workshops = _title_set(workshop_titles)
+                number += 1
+                ticket.purchase_date = today
+                self._add_ticket(attendee, ticket)
+                # logged with the rest of the batch below
+                events.append(self._ticket_event(attendee, ticket, exhibitions, workshop_titles))
+                results[i] = (attendee, ticket, added)
+
+            self._log_many(events)
+        self._compact_if_due()
+        return results
+
     # ------------ WORKSHOP BOOKING ------------
 
     def _find_workshop(self, title):
-        for ex in self.exhibition_list:
-            for ws in ex.workshop_list:
-                if ws.title == title:
-                    return ws
-        return None
-
-    def process_workshop_reservation(self, attendee, workshop_title):
-        if not attendee.can_book_workshop(workshop_title):
+        return self.catalog.find_workshop(title)
+
+    def _workshop_lock(self, title):
+        lock = self.workshop_locks.get(title)
+        if lock is None:
+            with self.workshop_locks_guard:
+                lock = self.workshop_locks.setdefault(title, threading.Lock())
+        return lock
+
+    def workshop_access(self, attendee):
+        """The attendee's access bits; see AccessIndex and workshop_allowed()."""
+        return self.access.mask(self._email_key(attendee.email), attendee)
+
+    def workshop_allowed(self, mask, workshop_title):
+        bit = self.catalog.workshop_bits.get(workshop_title)
+        if bit is None:
+            # a title no ticket names: only an All-Access pass opens it
+            return mask < 0
+        return mask >> bit & 1 == 1
+
+    def can_book_workshop(self, attendee, workshop_title):
+        """Attendee.can_book_workshop() as one bit test on the attendee's access."""
+        return self.workshop_allowed(self.workshop_access(attendee), workshop_title)
+
+    def bookable_workshops(self, attendee):
+        """Titles of the existing workshops the attendee's tickets open."""
+        return self.catalog.mask_titles(self.workshop_access(attendee))
+
+    def process_workshop_reservation(self, attendee, workshop_title, waitlist=False):
+        if not self.can_book_workshop(attendee, workshop_title):
             return False, "Your ticket does not allow this workshop."
 
         ws = self._find_workshop(workshop_title)
         if ws is None:
             return False, "Workshop not found."
 
-        if ws.is_full():
-            return False, "Workshop is already full."
+        # the capacity check and the seat it reserves happen under the
+        # workshop's lock, so two terminals cannot both take the last seat
+        with self.gate.operation(), self._workshop_lock(workshop_title), \
+                self.storage.transaction(self):
+            if workshop_title in attendee.booked_workshops:
+                return False, "You already booked this workshop."
+
+            key = self._email_key(attendee.email)
+            other = self.schedules.conflict(key, attendee, workshop_title)
+            if other is not None:
+                return False, "This workshop overlaps with " + other + "."
+
+            if ws.is_full():
+                if not waitlist:
+                    return False, "Workshop is already full."
+                queue = self.waitlists.setdefault(workshop_title, Waitlist())
+                place = queue.add(attendee.email, self._has_all_access(attendee))
+                if place == 0:
+                    return False, "Workshop is full. You are already on the waitlist."
+                return False, "Workshop is full. You are number " + str(place) + " on the waitlist."
+
+            # the ticket may have been cancelled since the check above
+            ticket = attendee.ticket_for(workshop_title)
+            if ticket is None:
+                return False, "Your ticket does not allow this workshop."
+
+            # another workshop may have been booked since the check above
+            clashes = self.schedules.claim(key, attendee, [workshop_title])
+            if len(clashes) > 0:
+                return False, "This workshop overlaps with " + clashes[workshop_title] + "."
+
+            self._book(attendee, ws, ticket)
+            self._log(("booking_made", attendee.email, workshop_title))
+        self._compact_if_due()
+        return True, "Workshop booked successfully."
+
+    def cancel_booking(self, attendee, workshop_title):
+        """Give up a seat; the next person on the waitlist gets it straight away."""
+        ws = self._find_workshop(workshop_title)
+        if ws is None:
+            return False, "Workshop not found."
 
-        if workshop_title in attendee.booked_workshops:
-            return False, "You already booked this workshop."
+        with self.gate.operation(), self._workshop_lock(workshop_title), \
+                self.storage.transaction(self):
+            if workshop_title not in attendee.booked_workshops:
+                return False, "You have not booked this workshop."
 
+            self._unbook(attendee, ws)
+            events = [("booking_cancelled", attendee.email, workshop_title)]
+            events.extend(self._promote_from_waitlist(ws))
+            self._log_many(events)
+        self._compact_if_due()
+        return True, "Booking cancelled."
+
+    def leave_waitlist(self, attendee, workshop_title):
+        with self._workshop_lock(workshop_title):
+            queue = self.waitlists.get(workshop_title)
+            return queue is not None and queue.remove(attendee.email)
+
+    # ------------ CANCELLATION ------------
+
+    # callers hold the workshop's lock
+    def _book(self, attendee, ws, ticket):
         ws.register(attendee.email)
-        attendee.add_booking(workshop_title)
-        return True, "Workshop booked successfully."
+        attendee.add_booking(ws.title)
+        if ticket is not None:
+            ticket.add_booking(ws.title)
+        self.search.booking_changed(self._email_key(attendee.email), ws.title, True)
+
+    def _unbook(self, attendee, ws):
+        ws.unregister(attendee.email)
+        attendee.cancel_booking(ws.title)
+        for ticket in attendee.owned_tickets:
+            ticket.remove_booking(ws.title)
+        key = self._email_key(attendee.email)
+        self.schedules.forget(key)
+        self.search.booking_changed(key, ws.title, False)
+
+    def _drop_ticket(self, attendee, ticket, dropped):
+        attendee.owned_tickets.remove(ticket)
+        self.ticket_registry.pop(ticket.id_code, None)
+        for title in dropped:
+            ws = self._find_workshop(title)
+            if ws is not None:
+                self._unbook(attendee, ws)
+        # bookings that another ticket still covers move over to it
+        for title in ticket.current_bookings:
+            other = attendee.ticket_for(title)
+            if other is not None and title in attendee.booked_workshops:
+                other.add_booking(title)
+        key = self._email_key(attendee.email)
+        self.access.forget(key)
+        self.search.tickets_changed(key, attendee, [ticket.id_code])
+
+    def _ticket_titles(self, ticket):
+        if ticket.allowed_workshops is ALL_WORKSHOPS:
+            return list(self.catalog.workshops)
+        return list(ticket.allowed_workshops)
+
+    def cancel_ticket(self, attendee, id_code):
+        """
+        Return a ticket for a full refund, recorded as a negative "Refund"
+        sale. Bookings that no other ticket of the attendee covers are
+        cancelled too and their seats go to the waitlists.
+        Returns (ok, message).
+        """
+        ticket = self._find_owned_ticket(attendee, id_code)
+        if ticket is None:
+            return False, "Ticket not found."
+
+        # every workshop the ticket opens is locked, so no booking can be
+        # made with the ticket while it is being taken away
+        titles = sorted(set(self._ticket_titles(ticket)))
+        # and the upgrade lock, so an upgrade is not paid for a ticket
+        # that is going away
+        locks = [self._workshop_lock(title) for title in titles] + [self.upgrade_lock]
+        with self.gate.operation():
+            for lock in locks:
+                lock.acquire()
+            try:
+                with self.storage.transaction(self):
+                    if self._find_owned_ticket(attendee, id_code) is not ticket:
+                        return False, "Ticket not found."
+
+                    others = [t for t in attendee.owned_tickets if t is not ticket]
+                    dropped = [title for title in attendee.booked_workshops
+                               if ticket.can_access_workshop(title)
+                               and not any(t.can_access_workshop(title) for t in others)]
+                    self._drop_ticket(attendee, ticket, dropped)
+
+                    day = date.today().isoformat()
+                    self._record_sale(day, "Refund", -ticket.cost)
+                    events = [("ticket_cancelled", attendee.email, id_code, day, ticket.cost, dropped)]
+                    for title in dropped:
+                        ws = self._find_workshop(title)
+                        if ws is not None:
+                            events.extend(self._promote_from_waitlist(ws))
+                    self._log_many(events)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        self._compact_if_due()
+        return True, "Ticket cancelled. " + str(ticket.cost) + " AED refunded."
+
+    # caller holds the workshop's lock
+    def _promote_from_waitlist(self, ws):
+        events = []
+        queue = self.waitlists.get(ws.title)
+
+        def take(email):
+            attendee = self.lookup_attendee(email)
+            if attendee is None or ws.title in attendee.booked_workshops:
+                queue.remove(email)
+                return False
+            ticket = attendee.ticket_for(ws.title)
+            if ticket is None:
+                queue.remove(email)
+                return False
+            # the attendee may have booked something at the same time since;
+            # they stay in line and get a later seat once that clash is gone
+            if len(self.schedules.claim(self._email_key(email), attendee, [ws.title])) > 0:
+                return False
+            self._book(attendee, ws, ticket)
+            events.append(("booking_made", attendee.email, ws.title))
+            return True
+
+        while queue is not None and not ws.is_full():
+            if queue.pop(take) is None:
+                break
+        return events
+
+    def _has_all_access(self, attendee):
+        for ticket in attendee.owned_tickets:
+            if ticket.category == "All-Access Pass":
+                return True
+        return False
+
+    def schedule_conflicts(self):
+        """(email, title, overlapping title) for every clash among existing bookings."""
+        return conflict_report(self.attendee_list, self.catalog.intervals)
+
+    def waitlist_stats(self):
+        """{workshop title: {depth, promoted, passed_over, average_wait, longest_wait}}"""
+        return {title: queue.stats() for title, queue in self.waitlists.items()}
+
+    def reserve_many(self, attendee, workshop_titles):
+        """
+        Book several workshops at once, all or nothing.
+        Returns (ok, {title: message}); when one title fails nothing is booked.
+        """
+        results = {}
+        workshops = {}
+        for title in workshop_titles:
+            if title in results:
+                continue
+            if not self.can_book_workshop(attendee, title):
+                results[title] = "Your ticket does not allow this workshop."
+            else:
+                ws = self._find_workshop(title)
+                if ws is None:
+                    results[title] = "Workshop not found."
+                else:
+                    workshops[title] = ws
+                    results[title] = None
+
+        # always take the workshop locks in the same (sorted) order so two
+        # batches that overlap cannot each hold a lock the other waits for
+        locks = [self._workshop_lock(title) for title in sorted(workshops)]
+        with self.gate.operation():
+            for lock in locks:
+                lock.acquire()
+            try:
+                with self.storage.transaction(self):
+                    tickets = {}
+                    for title, ws in workshops.items():
+                        tickets[title] = attendee.ticket_for(title)
+                        if title in attendee.booked_workshops:
+                            results[title] = "You already booked this workshop."
+                        elif tickets[title] is None:
+                            results[title] = "Your ticket does not allow this workshop."
+                        elif ws.is_full():
+                            results[title] = "Workshop is already full."
+
+                    ok = len(workshops) > 0 and all(msg is None for msg in results.values())
+                    if ok:
+                        clashes = self.schedules.claim(self._email_key(attendee.email),
+                                                       attendee, list(workshops))
+                        for title, other in clashes.items():
+                            results[title] = "This workshop overlaps with " + other + "."
+                        ok = len(clashes) == 0
+                    if ok:
+                        events = []
+                        for title, ws in workshops.items():
+                            self._book(attendee, ws, tickets[title])
+                            events.append(("booking_made", attendee.email, title))
+                            results[title] = "Workshop booked successfully."
+                        self._log_many(events)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+
+        if not ok:
+            for title in results:
+                if results[title] is None:
+                    results[title] = "Not booked: another workshop in the request failed."
+        self._compact_if_due()
+        return ok, results
+
+    # ------------ CONSISTENCY ------------
+
+    def check_invariants(self):
+        """
+        Cross-check workshop rosters, attendee bookings, ticket bookings,
+        ticket ids, the attendee index and the sales ledger against each
+        other. Returns a list of problems; empty when everything agrees.
+        """
+        # imported here because fsck.py imports this module
+        from fsck import verify
+        return [message for kind, message in verify(self)]
+
+    # ------------ TICKET LOOKUP / CHECK-IN ------------
+
+    def find_ticket(self, id_code):
+        """(ticket, owner) for a ticket id, or (None, None) if there is no such ticket."""
+        id_code = id_code.strip().upper()
+        entry = self.ticket_registry.get(id_code)
+        if not self.storage.lazy:
+            return entry if entry is not None else (None, None)
+
+        # a lazy storage may hand out a fresh copy of the attendee after
+        # every change, so the owner is looked up again each time
+        if entry is not None:
+            key = self._email_key(entry[1].email)
+        else:
+            key = self.storage.ticket_owner(id_code)
+        attendee = None if key is None else self.attendee_index.get(key)
+        ticket = None if attendee is None else self._find_owned_ticket(attendee, id_code)
+        if ticket is None:
+            return None, None
+        return ticket, attendee
+
+    def _check_in(self, id_code, workshop_title, now):
+        ticket, attendee = self.find_ticket(id_code)
+        if ticket is None:
+            return False, "Unknown or cancelled ticket."
+        if workshop_title:
+            if not ticket.can_access_workshop(workshop_title):
+                return False, "This ticket does not allow " + workshop_title + "."
+            if workshop_title not in attendee.booked_workshops:
+                return False, attendee.full_name + " has not booked " + workshop_title + "."
+        key = (ticket.id_code, workshop_title or "")
+        earlier = self.check_ins.get(key)
+        if earlier is not None:
+            return False, "Already checked in at " + earlier + "."
+        self.check_ins[key] = now
+        return True, "Welcome, " + attendee.full_name + "."
+
+    def check_in(self, id_code, workshop_title=None):
+        """
+        Validate one scan at the entrance (no workshop) or at a workshop
+        door. A ticket is let in once per door. Returns (ok, message).
+        """
+        now = time.strftime("%H:%M:%S")
+        with self.check_in_lock:
+            return self._check_in(id_code, workshop_title, now)
+
+    def check_in_many(self, scans):
+        """check_in() for a batch of (id_code, workshop title or None); one result per scan."""
+        now = time.strftime("%H:%M:%S")
+        with self.check_in_lock:
+            return [self._check_in(id_code, workshop_title, now)
+                    for id_code, workshop_title in scans]
+
+    def upgradeable_tickets(self):
+        """(attendee, ticket) for every ticket that can still take more exhibitions."""
+        if self.storage.lazy:
+            return [(a, t) for a in self.attendee_list for t in a.owned_tickets
+                    if t.category != "All-Access Pass"]
+        return [(a, t) for t, a in self.ticket_registry.values()
+                if t.category != "All-Access Pass"]
+
+    # ------------ ADMIN SEARCH ------------
+
+    def search_attendees(self, email_prefix="", name="", ticket_id="", category="",
+                         workshop="", offset=0, limit=20, count=True):
+        """
+        One page of the attendees matching every filter that is given:
+        email prefix, part of the name, ticket id, ticket category and
+        booked workshop. Returns (attendees, total matches); with
+        count=False the total may be None, which saves walking past the
+        page. The indexes are built on the first search and kept up to
+        date afterwards.
+        """
+        if not self.search.built:
+            # nothing may change while every attendee is indexed
+            with self.gate.exclusive():
+                if not self.search.built:
+                    self.search.build(self.attendee_list, self._email_key)
+        keys, total = self.search.search(email_prefix, name, ticket_id, category, workshop,
+                                         offset, limit, count)
+        return [self.attendee_index.get(key) for key in keys], total
 
     # ------------ SALES REPORT ------------
 
-    def daily_sales_report(self):
+    def daily_sales_report(self, date_from=None, date_to=None, category=None):
         if len(self.sales_list) == 0:
             return "No sales recorded yet."
 
-        totals = {}
-        for d, ttype, amt in self.sales_list:
-            totals.setdefault(d, 0)
-            totals[d] += amt
+        totals = self.sales.daily_totals(date_from, date_to, category)
+        return format_daily_report(totals)
 
-        report = "Date       | Amount\n----------------------\n"
-        for d in totals:
-            report += f"{d} | {totals[d]} AED\n"
-        return report
+    def sales_by_category(self, date_from=None, date_to=None):
+        return self.sales.category_totals(date_from, date_to)
 
     # ------------ TICKET UPGRADE ------------
 
@@ -328,11 +1546,25 @@ class Conference_system:
         if ticket.category == "All-Access Pass":
             return False, "Already Full Access."
 
-        for ex in self.exhibition_list:
-            if ex.title == exhibition_title:
-                ws_titles = [ws.title for ws in ex.workshop_list]
-                ticket.add_exhibition(exhibition_title, ws_titles)
-                self.sales_list.append((date.today().isoformat(), "Upgrade", 50.0))
-                return True, "Upgrade successful."
-
-        return False, "Exhibition not found."
\ No newline at end of file
+        ex = self.catalog.find_exhibition(exhibition_title)
+        if ex is None:
+            return False, "Exhibition not found."
+
+        with self.gate.operation(), self.upgrade_lock, self.storage.transaction(self):
+            # the ticket may have been cancelled since it was shown
+            if self._find_owned_ticket(attendee, ticket.id_code) is not ticket:
+                return False, "Ticket not found."
+            if exhibition_title in ticket.exhibitions:
+                return False, "Ticket already includes this exhibition."
+
+            day = date.today().isoformat()
+            self._apply_upgrade(attendee, ticket, exhibition_title, day)
+            self._log(("upgrade_applied", attendee.email, ticket.id_code, exhibition_title, day))
+        self._compact_if_due()
+        return True, "Upgrade successful."
+
+    def _apply_upgrade(self, attendee, ticket, exhibition_title, day):
+        ws_titles = self.catalog.exhibition_workshops[exhibition_title]
+        ticket.add_exhibition(exhibition_title, ws_titles)
+        self.access.grant(self._email_key(attendee.email), self.catalog.title_mask(ws_titles))
+        self._record_sale(day, "Upgrade", 50.0)
\ No newline at end of file
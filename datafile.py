@@ -0,0 +1,454 @@
+import argparse
+import json
+import os
+import pickle
+import struct
+import sys
+import zlib
+from array import array
+
+from data_classes import (
+    OrderedSet,
+    Attendee,
+    ExhibitionPass,
+    AllAccessPass,
+    Workshop,
+    Exhibition,
+    ALL_WORKSHOPS,
+    _title_set
+)
+from sales import SalesColumns
+
+
+# =======================
+# FILE LAYOUT
+# =======================
+#
+#   header   b"GWDAT" version:u16 kind-length:u8 kind
+#   frames   type:1 byte  length:u32  crc32:u32  payload
+#            "J" a JSON list of rows, "B" raw little-endian array bytes,
+#            "E" the end frame: JSON {"frames": n, "rows": n}
+#
+# Rows are positional lists whose layout is fixed per version. Strings
+# that repeat (workshop titles, categories, dates) are written once into
+# a symbol table and referred to by number; each "J" payload is
+# [new symbols, rows] so a reader can build the table as it streams.
+#
+# journal.dat has the same header with one "J" frame per batch of events,
+# holding [sequence number of the first event, events]; see journal.py.
+
+MAGIC = b"GWDAT"
+VERSION = 1
+FRAME = struct.Struct("<cII")
+CHUNK_ROWS = 10000
+
+# how the old pickle files start (protocol 2 and later)
+PICKLE_START = b"\x80"
+
+
+class DataFileError(Exception):
+    pass
+
+
+# =======================
+# WRITING
+# =======================
+
+def file_header(kind):
+    name = kind.encode()
+    return MAGIC + struct.pack("<HB", VERSION, len(name)) + name
+
+
+def frame_bytes(kind, payload):
+    return FRAME.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+
+class _Writer:
+    def __init__(self, f, kind):
+        self.f = f
+        self.symbols = {}
+        self.new_symbols = []
+        self.rows = []
+        self.frames = 0
+        self.row_count = 0
+        f.write(file_header(kind))
+
+    def symbol(self, text):
+        number = self.symbols.get(text)
+        if number is None:
+            number = len(self.symbols)
+            self.symbols[text] = number
+            self.new_symbols.append(text)
+        return number
+
+    def symbol_list(self, items):
+        return [self.symbol(t) for t in items]
+
+    def frame(self, kind, payload):
+        self.f.write(frame_bytes(kind, payload))
+        self.frames += 1
+
+    def row(self, row):
+        self.rows.append(row)
+        self.row_count += 1
+        if len(self.rows) >= CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.rows or self.new_symbols:
+            payload = json.dumps([self.new_symbols, self.rows], separators=(",", ":"))
+            self.frame(b"J", payload.encode())
+            self.new_symbols = []
+            self.rows = []
+
+    def binary(self, column):
+        if sys.byteorder == "big":
+            column = array(column.typecode, column)
+            column.byteswap()
+        self.frame(b"B", column.tobytes())
+
+    def finish(self):
+        self.flush()
+        end = json.dumps({"frames": self.frames, "rows": self.row_count}).encode()
+        self.frame(b"E", end)
+
+
+def write_file(filename, kind, encode, data):
+    """Write data through encode(writer, data) into filename and fsync it."""
+    with open(filename, "wb") as f:
+        writer = _Writer(f, kind)
+        encode(writer, data)
+        writer.finish()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_atomic(filename, kind, encode, data):
+    """
+    Write data into filename.tmp and rename it over filename, so a crash
+    leaves either the old file or the new one, never half of each.
+    """
+    tmp = filename + ".tmp"
+    write_file(tmp, kind, encode, data)
+    os.replace(tmp, filename)
+    sync_dir(filename)
+
+
+def sync_dir(filename):
+    """fsync the folder holding filename, so a rename into it survives a crash."""
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# ------------ ENCODERS ------------
+
+def _encode_ticket(w, ticket):
+    if ticket.allowed_workshops is ALL_WORKSHOPS:
+        return [1, ticket.id_code, ticket.cost, w.symbol(ticket.category),
+                w.symbol(ticket.purchase_date), w.symbol_list(ticket.current_bookings)]
+    return [0, ticket.id_code, ticket.cost, w.symbol(ticket.category),
+            w.symbol(ticket.purchase_date), w.symbol_list(ticket.current_bookings),
+            w.symbol_list(ticket.exhibitions), w.symbol_list(ticket.allowed_workshops)]
+
+
+def encode_attendee(w, a):
+    """One attendee as a row; w only needs symbol() and symbol_list()."""
+    return [a.email, a.full_name, a.password, w.symbol_list(a.booked_workshops),
+            [_encode_ticket(w, t) for t in a.owned_tickets]]
+
+
+def encode_attendees(w, attendees):
+    for a in attendees:
+        w.row(encode_attendee(w, a))
+
+
+def encode_exhibitions(w, exhibitions):
+    # rosters can be long, so they go in slices of their own rows
+    for ex in exhibitions:
+        w.row(["E", ex.exhibition_id, ex.title])
+        for ws in ex.workshop_list:
+            w.row(["W", ws.title, ws.schedule, ws.max_capacity])
+            roster = list(ws.registered_attendees)
+            for i in range(0, len(roster), CHUNK_ROWS):
+                w.row(["R", roster[i:i + CHUNK_ROWS]])
+
+
+def encode_sales(w, sales):
+    if not isinstance(sales, SalesColumns):
+        sales = SalesColumns(sales)
+    w.row(w.symbol_list(sales.categories))
+    w.flush()
+    step = CHUNK_ROWS * 10
+    for i in range(0, len(sales), step):
+        w.row([min(step, len(sales) - i)])
+        w.flush()
+        for column in (sales.day_numbers, sales.category_codes, sales.amounts):
+            w.binary(column[i:i + step])
+
+
+def encode_manifest(w, manifest):
+    w.row([manifest["seq"], manifest["pending"]])
+
+
+ENCODERS = {
+    "attendees": encode_attendees,
+    "exhibitions": encode_exhibitions,
+    "sales": encode_sales,
+    "manifest": encode_manifest,
+}
+
+
+def save(filename, kind, data):
+    write_atomic(filename, kind, ENCODERS[kind], data)
+
+
+# =======================
+# READING
+# =======================
+
+class _InternedList(list):
+    def extend(self, items):
+        list.extend(self, (sys.intern(s) for s in items))
+
+
+class _Reader:
+    def __init__(self, f, filename):
+        self.f = f
+        self.filename = filename
+        # every symbol is a title, category or date worth sharing
+        self.symbols = _InternedList()
+        self.frames = 0
+        self.row_count = 0
+        self.kind = read_header(f, filename)
+
+    def _frame(self):
+        head = self.f.read(FRAME.size)
+        if len(head) < FRAME.size:
+            raise DataFileError(self.filename + ": file is cut short")
+        kind, length, crc = FRAME.unpack(head)
+        payload = self.f.read(length)
+        if len(payload) < length:
+            raise DataFileError(self.filename + ": file is cut short")
+        if zlib.crc32(payload) != crc:
+            raise DataFileError(f"{self.filename}: checksum mismatch in frame {self.frames}")
+        self.frames += 1
+        return kind, payload
+
+    def chunks(self):
+        """Yield ("rows", list) and ("binary", bytes) frames; checks the end frame."""
+        while True:
+            kind, payload = self._frame()
+            if kind == b"J":
+                new_symbols, rows = json.loads(payload)
+                self.symbols.extend(new_symbols)
+                self.row_count += len(rows)
+                yield "rows", rows
+            elif kind == b"B":
+                yield "binary", payload
+            elif kind == b"E":
+                end = json.loads(payload)
+                if end["frames"] != self.frames - 1 or end["rows"] != self.row_count:
+                    raise DataFileError(self.filename + ": frame or row count does not match")
+                return
+            else:
+                raise DataFileError(f"{self.filename}: unknown frame type {kind!r}")
+
+
+def read_header(f, filename):
+    """Check the header at the start of f; returns the kind of data it holds."""
+    head = f.read(len(MAGIC) + 3)
+    if len(head) < len(MAGIC) + 3 or head[:len(MAGIC)] != MAGIC:
+        raise DataFileError(filename + ": not a GreenWave data file")
+    version, name_length = struct.unpack("<HB", head[len(MAGIC):])
+    if version > VERSION:
+        raise DataFileError(f"{filename}: written by a newer version ({version})")
+    return f.read(name_length).decode()
+
+
+# ------------ DECODERS ------------
+
+def _decode_ticket(row, symbols):
+    if row[0] == 1:
+        ticket = AllAccessPass(row[1])
+    else:
+        ticket = ExhibitionPass(row[1], [symbols[s] for s in row[6]])
+        ticket.allowed_workshops = _title_set(symbols[s] for s in row[7])
+    ticket.cost = row[2]
+    ticket.category = symbols[row[3]]
+    ticket.purchase_date = symbols[row[4]]
+    ticket.current_bookings = _title_set(symbols[s] for s in row[5])
+    return ticket
+
+
+def decode_attendee(row, symbols):
+    email, name, password, booked, tickets = row
+    a = Attendee(email, name, password)
+    # symbols were interned once when read, so these are plain lookups
+    a.booked_workshops = OrderedSet(symbols[s] for s in booked)
+    a.owned_tickets = [_decode_ticket(t, symbols) for t in tickets]
+    return a
+
+
+def decode_attendees(reader):
+    symbols = reader.symbols
+    attendees = []
+    for kind, rows in reader.chunks():
+        for row in rows:
+            attendees.append(decode_attendee(row, symbols))
+    return attendees
+
+
+def decode_exhibitions(reader):
+    exhibitions = []
+    workshop = None
+    for kind, rows in reader.chunks():
+        for row in rows:
+            if row[0] == "E":
+                exhibitions.append(Exhibition(row[1], row[2]))
+            elif row[0] == "W":
+                workshop = Workshop(row[1], row[2], row[3])
+                exhibitions[-1].workshop_list.append(workshop)
+            else:
+                for email in row[1]:
+                    workshop.registered_attendees.add(email)
+    return exhibitions
+
+
+def decode_sales(reader):
+    sales = SalesColumns()
+    columns = (sales.day_numbers, sales.category_codes, sales.amounts)
+    chunks = reader.chunks()
+    kind, rows = next(chunks)
+    for name in (reader.symbols[s] for s in rows[0]):
+        sales._category_code(name)
+
+    # each slice is a ["count"] row followed by one frame per column
+    column = 0
+    for kind, payload in chunks:
+        if kind == "rows":
+            column = 0
+            continue
+        part = array(columns[column].typecode)
+        part.frombytes(payload)
+        if sys.byteorder == "big":
+            part.byteswap()
+        columns[column].extend(part)
+        column += 1
+    if not len(sales.day_numbers) == len(sales.category_codes) == len(sales.amounts):
+        raise DataFileError(reader.filename + ": sales columns differ in length")
+    return sales
+
+
+def decode_manifest(reader):
+    manifest = None
+    for kind, rows in reader.chunks():
+        for seq, pending in rows:
+            manifest = {"seq": seq, "pending": pending}
+    if manifest is None:
+        raise DataFileError(reader.filename + ": empty manifest")
+    return manifest
+
+
+DECODERS = {
+    "attendees": decode_attendees,
+    "exhibitions": decode_exhibitions,
+    "sales": decode_sales,
+    "manifest": decode_manifest,
+}
+
+
+def is_data_file(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load(filename, kind):
+    """
+    Read a file written by save(). Raises FileNotFoundError when it does
+    not exist and DataFileError when it is damaged or of another kind.
+    """
+    with open(filename, "rb") as f:
+        reader = _Reader(f, filename)
+        if reader.kind != kind:
+            raise DataFileError(f"{filename}: holds {reader.kind}, expected {kind}")
+        return DECODERS[kind](reader)
+
+
+def load_any(filename, kind):
+    """load() for new files, pickle.load() for .dat files from before the format."""
+    with open(filename, "rb") as f:
+        start = f.read(len(MAGIC))
+        if start == MAGIC:
+            f.close()
+            return load(filename, kind)
+        if not start.startswith(PICKLE_START):
+            raise DataFileError(filename + ": neither a GreenWave data file nor a pickle")
+        f.seek(0)
+        try:
+            return pickle.load(f)
+        except Exception as e:
+            raise DataFileError(f"{filename}: damaged pickle file ({e})") from e
+
+
+# =======================
+# CONVERTER
+# =======================
+
+def _pickled_events(filename):
+    events = []
+    with open(filename, "rb") as f:
+        while True:
+            try:
+                events.append(pickle.load(f))
+            except EOFError:
+                return events
+            except (pickle.UnpicklingError, ValueError, TypeError) as e:
+                # the old journal could end in a half-written batch
+                if len(f.read(1)) == 0:
+                    return events
+                raise DataFileError(f"{filename}: damaged pickle journal ({e})") from e
+
+
+def convert_pickle_files(data_dir="."):
+    """Rewrite the pickle .dat files and journal in data_dir in the new format, in place."""
+    # imported here because journal.py imports this module
+    from journal import Journal
+
+    converted = []
+    for kind in ("attendees", "exhibitions", "sales"):
+        filename = os.path.join(data_dir, kind + ".dat")
+        if not os.path.exists(filename) or is_data_file(filename):
+            continue
+        save(filename, kind, load_any(filename, kind))
+        converted.append(filename)
+
+    filename = os.path.join(data_dir, "journal.dat")
+    if os.path.exists(filename) and os.path.getsize(filename) > 0 and not is_data_file(filename):
+        events = _pickled_events(filename)
+        tmp = filename + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        journal = Journal(tmp)
+        journal.extend(events)
+        journal.close()
+        os.replace(tmp, filename)
+        sync_dir(filename)
+        converted.append(filename)
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled .dat files to the GreenWave data format")
+    parser.add_argument("--data-dir", default=".", help="folder holding the .dat files")
+    args = parser.parse_args()
+
+    converted = convert_pickle_files(args.data_dir)
+    if converted:
+        for filename in converted:
+            print("converted " + filename)
+    else:
+        print("nothing to convert")
@@ -1,4 +1,9 @@
+import argparse
+import queue
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 from data_classes import (
     Conference_system,
@@ -9,8 +14,155 @@ from data_classes import (
     Workshop,
     Exhibition
 )
+from storage import SQLiteStorage
+from snapshot import SnapshotStorage
 
 
+# =======================
+# PAGED LIST
+# =======================
+
+def page_of(items, start, stop):
+    """items[start:stop], also for the lazy attendee lists that only iterate."""
+    if isinstance(items, list):
+        return items[start:stop]
+    return list(islice(items, start, stop))
+
+
+class PagedList:
+    """
+    Shows a long list of text rows one page at a time. The labels for a
+    page are made once and only get new text when the page changes, so
+    50,000 attendees cost as many widgets as 20.
+    fetch(start, stop) returns the texts of rows start..stop-1.
+    """
+
+    def __init__(self, parent, page_size=20, font=None):
+        self.page_size = page_size
+        self.page = 0
+        self.count = 0
+        self.fetch = None
+
+        self.frame = tk.Frame(parent)
+        self.labels = []
+        for i in range(page_size):
+            label = tk.Label(self.frame, text="") if font is None else tk.Label(self.frame, text="", font=font)
+            label.grid(row=i, column=0, sticky="w")
+            self.labels.append(label)
+
+        nav = tk.Frame(self.frame)
+        nav.grid(row=page_size, column=0, pady=5)
+        tk.Button(nav, text="<", width=3,
+                  command=lambda: self.show_page(self.page - 1)).grid(row=0, column=0)
+        self.page_label = tk.Label(nav, text="")
+        self.page_label.grid(row=0, column=1, padx=5)
+        tk.Button(nav, text=">", width=3,
+                  command=lambda: self.show_page(self.page + 1)).grid(row=0, column=2)
+        self.page_entry = tk.Entry(nav, width=5)
+        self.page_entry.grid(row=0, column=3, padx=5)
+        tk.Button(nav, text="Go", command=self.go_to_page).grid(row=0, column=4)
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def set_rows(self, count, fetch):
+        self.count = count
+        self.fetch = fetch
+        self.show_page(0)
+
+    def page_count(self):
+        return max(1, (self.count + self.page_size - 1) // self.page_size)
+
+    def show_page(self, page):
+        self.page = min(max(page, 0), self.page_count() - 1)
+        start = self.page * self.page_size
+        texts = self.fetch(start, min(start + self.page_size, self.count))
+        for i, label in enumerate(self.labels):
+            label.config(text=texts[i] if i < len(texts) else "")
+        self.page_label.config(text=f"Page {self.page + 1} of {self.page_count()} "
+                                    f"({self.count} rows)")
+
+    def go_to_page(self):
+        try:
+            self.show_page(int(self.page_entry.get()) - 1)
+        except ValueError:
+            pass
+
+    def refresh_row(self, index):
+        """Redraw one row, if it is on the page being shown."""
+        start = self.page * self.page_size
+        if start <= index < start + self.page_size and index < self.count:
+            self.labels[index - start].config(text=self.fetch(index, index + 1)[0])
+
+
+# =======================
+# BACKGROUND WORKER
+# =======================
+
+class BackgroundWorker:
+    """
+    Runs slow Conference_system calls (loading, saving, reports) on one
+    background thread so the window keeps responding. Tk widgets may only
+    be touched from the main thread, so results go into a queue that the
+    main loop empties every POLL_MS through root.after. While a job runs,
+    status_label shows what it is and for how long it has been running.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, status_label):
+        self.root = root
+        self.status_label = status_label
+        # one thread: jobs run in the order they were handed in
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.Queue()
+        self.running = []       # [label, start time, on_done, on_error]
+        self.root.after(self.POLL_MS, self.poll)
+
+    def submit(self, label, func, on_done=None, on_error=None):
+        job = [label, time.monotonic(), on_done, on_error]
+        self.running.append(job)
+        self.executor.submit(self._run, job, func)
+
+    def _run(self, job, func):
+        try:
+            self.results.put((job, True, func()))
+        except Exception as e:
+            self.results.put((job, False, e))
+
+    def busy(self):
+        return len(self.running) > 0
+
+    def poll(self):
+        while True:
+            try:
+                job, ok, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.running.remove(job)
+            label, start, on_done, on_error = job
+            if not ok:
+                self.status_label.config(text=f"{label} failed: {result}")
+                if on_error is not None:
+                    on_error(result)
+            else:
+                self.status_label.config(text=f"{label}: done in {time.monotonic() - start:.1f} s")
+                if on_done is not None:
+                    on_done(result)
+
+        if self.running:
+            label, start = self.running[0][:2]
+            self.status_label.config(text=f"{label}... {time.monotonic() - start:.1f} s")
+        self.root.after(self.POLL_MS, self.poll)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+# =======================
+# GUI
+# =======================
+
 class Conference_GUI:
     """
     Main GUI for the GreenWave Conference System.
@@ -18,11 +170,15 @@ class Conference_GUI:
     Tk, Frame, Label, Entry, Button, pack, grid.
     """
 
-    def __init__(self):
-        # create system and load data
-        self.system = Conference_system()
-        self.system.load_all_data()
-        self.system.create_default_exhibition()
+    def __init__(self, storage=None, autosave_seconds=60):
+        # create system (pickle files unless another storage is given);
+        # the data is loaded in the background once the window is up
+        self.system = Conference_system(storage)
+        self.loaded = False
+        self.closing = False
+        self.autosave_ms = int(autosave_seconds * 1000)
+        # bumped by reset_view, so a late result knows its screen is gone
+        self.screen = 0
 
         self.current_user = None
 
@@ -31,32 +187,93 @@ class Conference_GUI:
         self.root.title("GreenWave Conference System")
         self.root.geometry("700x600")
 
+        # status line for background jobs; outside main_frame so that
+        # reset_view leaves it alone
+        self.status_label = tk.Label(self.root, text="")
+        self.status_label.pack(side="bottom", pady=5)
+        self.worker = BackgroundWorker(self.root, self.status_label)
+
         # main frame
         self.main_frame = tk.Frame(self.root)
         self.main_frame.pack(pady=20, padx=20)
 
         # first screen
-        self.show_home_screen()
+        self.show_message_screen("Loading conference data...")
+        self.worker.submit("Loading data", self.load_data, self.data_loaded,
+                           lambda e: self.show_message_screen("Could not load the data: " + str(e)))
 
         # save data when closing
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.root.mainloop()
 
+    def load_data(self):
+        self.system.load_all_data()
+        self.system.create_default_exhibition()
+
+    def data_loaded(self, result):
+        self.loaded = True
+        self.show_home_screen()
+        self.schedule_autosave()
+
     # =======================
     # UTILITIES
     # =======================
 
     def reset_view(self):
         """Remove all widgets from main_frame."""
+        self.screen += 1
         for w in self.main_frame.winfo_children():
             w.destroy()
 
+    def show_message_screen(self, text):
+        self.reset_view()
+        tk.Label(self.main_frame, text=text).pack(pady=40)
+
+    def on_screen(self, callback):
+        """Wrap callback so it only runs if the screen it belongs to is still shown."""
+        screen = self.screen
+
+        def run(result):
+            if self.screen == screen:
+                callback(result)
+        return run
+
     def on_close(self):
-        """Store all data then close."""
-        self.system.store_all_data()
+        """Store all data in the background, then close."""
+        if self.closing:
+            return
+        if not self.loaded:
+            # nothing was loaded, so there is nothing to save over the files
+            self.worker.shutdown()
+            self.root.destroy()
+            return
+        self.closing = True
+        self.show_message_screen("Saving...")
+        self.worker.submit("Saving", self.system.store_all_data, self.closed, self.save_failed)
+
+    def closed(self, result):
+        self.worker.shutdown()
         self.root.destroy()
 
+    def save_failed(self, error):
+        self.closing = False
+        self.show_message_screen("Error: could not save (" + str(error) + ")")
+        tk.Button(self.main_frame, text="Back to Home", width=20,
+                  command=self.show_home_screen).pack(pady=10)
+
+    def schedule_autosave(self):
+        if self.autosave_ms > 0:
+            self.root.after(self.autosave_ms, self.autosave)
+
+    def autosave(self):
+        if self.closing:
+            return
+        # an autosave that is still running (or a report) is not queued twice
+        if not self.worker.busy():
+            self.worker.submit("Autosave", self.system.autosave)
+        self.schedule_autosave()
+
     # =======================
     # HOME SCREEN
     # =======================
@@ -391,47 +608,25 @@ class Conference_GUI:
                       command=self.open_attendee_dashboard).pack(pady=10)
             return
 
-        list_frame = tk.Frame(self.main_frame)
-        list_frame.pack(pady=10)
-
-        self.workshop_list = []
-        row = 0
-        num = 1
-
-        for ex in self.system.exhibition_list:
-            tk.Label(list_frame, text="--- " + ex.title + " ---",
-                     font=("Arial", 10, "bold")).grid(
-                row=row, column=0, sticky="w", pady=5
-            )
-            row += 1
-
-            for ws in ex.workshop_list:
-                self.workshop_list.append(ws)
-
-                can_access = self.current_user.can_book_workshop(ws.title)
-                already = ws.title in self.current_user.booked_workshops
-                full = ws.is_full()
-
-                if already:
-                    status = "[BOOKED]"
-                elif full:
-                    status = "[FULL]"
-                elif not can_access:
-                    status = "[NO ACCESS]"
-                else:
-                    status = "[Available: " + str(ws.get_available_spots()) + "]"
-
-                text = f"{num}. {ws.title} | {ws.schedule} {status}"
-                tk.Label(list_frame, text=text).grid(
-                    row=row, column=0, sticky="w", pady=1
-                )
-                row += 1
-                num += 1
+        self.workshop_list, rows = self.workshop_rows()
+        # bookings do not change access, so the mask holds while the screen is up
+        self.access_mask = self.system.workshop_access(self.current_user)
+        # workshop title -> its rows, to redraw just those after a booking
+        self.workshop_row_numbers = {}
+        for i, (num, item) in enumerate(rows):
+            if num > 0:
+                self.workshop_row_numbers.setdefault(item.title, []).append(i)
+
+        self.workshop_page = PagedList(self.main_frame)
+        self.workshop_page.pack(pady=10)
+        self.workshop_page.set_rows(len(rows), lambda start, stop: [
+            self.booking_row_text(num, item) for num, item in rows[start:stop]
+        ])
 
         select_frame = tk.Frame(self.main_frame)
         select_frame.pack(pady=10)
 
-        tk.Label(select_frame, text="Enter workshop number:").grid(
+        tk.Label(select_frame, text="Enter workshop number(s), e.g. 1,2,3:").grid(
             row=0, column=0, pady=5
         )
         self.ws_select_entry = tk.Entry(select_frame, width=10)
@@ -448,6 +643,37 @@ class Conference_GUI:
         tk.Button(btns, text="Back", width=15,
                   command=self.open_attendee_dashboard).grid(row=0, column=1, padx=5)
 
+    def workshop_rows(self):
+        """(workshops in number order, rows of (0, exhibition) or (number, workshop))."""
+        workshops = []
+        rows = []
+        for ex in self.system.exhibition_list:
+            rows.append((0, ex))
+            for ws in ex.workshop_list:
+                workshops.append(ws)
+                rows.append((len(workshops), ws))
+        return workshops, rows
+
+    def booking_row_text(self, num, item):
+        if num == 0:
+            return "--- " + item.title + " ---"
+        ws = item
+
+        can_access = self.system.workshop_allowed(self.access_mask, ws.title)
+        already = ws.title in self.current_user.booked_workshops
+        full = ws.is_full()
+
+        if already:
+            status = "[BOOKED]"
+        elif full:
+            status = "[FULL]"
+        elif not can_access:
+            status = "[NO ACCESS]"
+        else:
+            status = "[Available: " + str(ws.get_available_spots()) + "]"
+
+        return f"{num}. {ws.title} | {ws.schedule} {status}"
+
     def confirm_booking(self):
         selection = self.ws_select_entry.get()
         if selection == "":
@@ -455,19 +681,32 @@ class Conference_GUI:
             return
 
         try:
-            idx = int(selection) - 1
-            if idx < 0 or idx >= len(self.workshop_list):
-                self.ws_msg_label.config(text="Error: Invalid number")
-                return
-
-            workshop = self.workshop_list[idx]
-            ok, msg = self.system.process_workshop_reservation(
-                self.current_user, workshop.title
-            )
+            indexes = [int(part) - 1 for part in selection.split(",")]
+            for idx in indexes:
+                if idx < 0 or idx >= len(self.workshop_list):
+                    self.ws_msg_label.config(text="Error: Invalid number")
+                    return
+
+            titles = [self.workshop_list[idx].title for idx in indexes]
+            if len(titles) == 1:
+                # a full workshop puts the attendee on its waitlist
+                ok, msg = self.system.process_workshop_reservation(
+                    self.current_user, titles[0], waitlist=True
+                )
+            else:
+                # a whole day at once: either every workshop is booked or none
+                ok, results = self.system.reserve_many(self.current_user, titles)
+                if ok:
+                    msg = str(len(titles)) + " workshops booked."
+                else:
+                    msg = "; ".join(t + ": " + m for t, m in results.items()
+                                    if not m.startswith("Not booked"))
 
             if ok:
                 self.ws_msg_label.config(text="Success: " + msg)
-                self.book_workshop()
+                for title in titles:
+                    for i in self.workshop_row_numbers[title]:
+                        self.workshop_page.refresh_row(i)
             else:
                 self.ws_msg_label.config(text="Error: " + msg)
         except:
@@ -509,9 +748,40 @@ class Conference_GUI:
             for ws_title in self.current_user.booked_workshops:
                 tk.Label(self.main_frame, text="- " + ws_title).pack(anchor="w")
 
+        cancel = tk.Frame(self.main_frame)
+        cancel.pack(pady=10)
+
+        tk.Label(cancel, text="Ticket ID or workshop:").grid(row=0, column=0, pady=5)
+        self.cancel_entry = tk.Entry(cancel, width=25)
+        self.cancel_entry.grid(row=0, column=1, pady=5)
+
+        tk.Button(cancel, text="Cancel Booking", width=15,
+                  command=self.cancel_booking).grid(row=1, column=0, padx=5)
+        tk.Button(cancel, text="Cancel Ticket", width=15,
+                  command=self.cancel_ticket).grid(row=1, column=1, padx=5)
+
+        self.cancel_msg_label = tk.Label(self.main_frame, text="")
+        self.cancel_msg_label.pack(pady=5)
+
         tk.Button(self.main_frame, text="Back", width=15,
                   command=self.open_attendee_dashboard).pack(pady=20)
 
+    def cancel_booking(self):
+        ok, msg = self.system.cancel_booking(self.current_user, self.cancel_entry.get().strip())
+        self.show_cancel_result(ok, msg)
+
+    def cancel_ticket(self):
+        ok, msg = self.system.cancel_ticket(self.current_user, self.cancel_entry.get().strip())
+        self.show_cancel_result(ok, msg)
+
+    def show_cancel_result(self, ok, msg):
+        if ok:
+            # redraw the lists, then show what happened
+            self.show_user_profile()
+            self.cancel_msg_label.config(text="Success: " + msg)
+        else:
+            self.cancel_msg_label.config(text="Error: " + msg)
+
     # =======================
     # ADMIN DASHBOARD
     # =======================
@@ -530,6 +800,8 @@ class Conference_GUI:
                   command=self.view_sales_data).pack(pady=5)
         tk.Button(frame, text="View All Attendees", width=25,
                   command=self.show_all_attendees).pack(pady=5)
+        tk.Button(frame, text="Search Attendees", width=25,
+                  command=self.open_attendee_search).pack(pady=5)
         tk.Button(frame, text="Workshop Capacity", width=25,
                   command=self.show_workshop_capacity).pack(pady=5)
         tk.Button(frame, text="Ticket Upgrades", width=25,
@@ -545,14 +817,20 @@ class Conference_GUI:
                          font=("Arial", 14, "bold"))
         title.pack(pady=10)
 
-        report = self.system.daily_sales_report()
-        lines = report.split("\n")
-        for line in lines:
-            tk.Label(self.main_frame, text=line, font=("Courier", 10)).pack(anchor="w")
+        report_page = PagedList(self.main_frame, font=("Courier", 10))
+        report_page.pack(pady=5)
+        report_page.set_rows(1, lambda start, stop: ["Preparing report..."])
 
         tk.Button(self.main_frame, text="Back", width=15,
                   command=self.open_admin_dashboard).pack(pady=20)
 
+        def show_report(report):
+            lines = report.rstrip("\n").split("\n")
+            report_page.set_rows(len(lines), lambda start, stop: lines[start:stop])
+
+        self.worker.submit("Preparing report", self.system.daily_sales_report,
+                           self.on_screen(show_report))
+
     def show_all_attendees(self):
         self.reset_view()
 
@@ -567,13 +845,70 @@ class Conference_GUI:
                      font=("Arial", 10, "bold")).pack(pady=5)
             tk.Label(self.main_frame, text="-" * 50).pack()
 
-            for att in self.system.attendee_list:
-                text = f"{att.full_name} | {att.email} | {len(att.owned_tickets)}"
-                tk.Label(self.main_frame, text=text).pack(anchor="w")
+            attendees = self.system.attendee_list
+            page = PagedList(self.main_frame)
+            page.pack()
+            page.set_rows(len(attendees), lambda start, stop: [
+                f"{att.full_name} | {att.email} | {len(att.owned_tickets)}"
+                for att in page_of(attendees, start, stop)
+            ])
 
         tk.Button(self.main_frame, text="Back", width=15,
                   command=self.open_admin_dashboard).pack(pady=20)
 
+    def open_attendee_search(self):
+        self.reset_view()
+
+        title = tk.Label(self.main_frame, text="Search Attendees",
+                         font=("Arial", 14, "bold"))
+        title.pack(pady=10)
+
+        form = tk.Frame(self.main_frame)
+        form.pack(pady=5)
+
+        self.search_entries = {}
+        fields = [("email_prefix", "Email starts with:"), ("name", "Name contains:"),
+                  ("ticket_id", "Ticket ID:"), ("category", "Ticket category:"),
+                  ("workshop", "Booked workshop:")]
+        for row, (field, text) in enumerate(fields):
+            tk.Label(form, text=text).grid(row=row, column=0, sticky="w", pady=2)
+            entry = tk.Entry(form, width=30)
+            entry.grid(row=row, column=1, pady=2)
+            self.search_entries[field] = entry
+
+        tk.Button(self.main_frame, text="Search", width=15,
+                  command=self.run_attendee_search).pack(pady=5)
+
+        self.search_msg_label = tk.Label(self.main_frame, text="")
+        self.search_msg_label.pack(pady=5)
+
+        self.search_page = PagedList(self.main_frame, page_size=15)
+        self.search_page.pack()
+        self.search_page.set_rows(0, lambda start, stop: [])
+
+        tk.Button(self.main_frame, text="Back", width=15,
+                  command=self.open_admin_dashboard).pack(pady=10)
+
+    def run_attendee_search(self):
+        filters = {field: entry.get().strip() for field, entry in self.search_entries.items()}
+
+        def fetch(start, stop):
+            # the total is known from the first search below
+            found, total = self.system.search_attendees(offset=start, limit=stop - start,
+                                                        count=False, **filters)
+            return [f"{att.full_name} | {att.email} | {len(att.owned_tickets)} tickets"
+                    for att in found]
+
+        def show(result):
+            found, total = result
+            self.search_msg_label.config(text=str(total) + " attendees found")
+            self.search_page.set_rows(total, fetch)
+
+        # the first search builds the indexes, which takes a while
+        self.search_msg_label.config(text="Searching...")
+        self.worker.submit("Searching", lambda: self.system.search_attendees(limit=0, **filters),
+                           self.on_screen(show))
+
     def show_workshop_capacity(self):
         self.reset_view()
 
@@ -581,20 +916,25 @@ class Conference_GUI:
                          font=("Arial", 14, "bold"))
         title.pack(pady=10)
 
-        for ex in self.system.exhibition_list:
-            tk.Label(self.main_frame, text="--- " + ex.title + " ---",
-                     font=("Arial", 10, "bold")).pack(pady=5, anchor="w")
-
-            for ws in ex.workshop_list:
-                reg = len(ws.registered_attendees)
-                cap = ws.max_capacity
-                status = "FULL" if ws.is_full() else "Available"
-                text = f"  {ws.title} | {reg}/{cap} | {status}"
-                tk.Label(self.main_frame, text=text).pack(anchor="w")
+        workshops, rows = self.workshop_rows()
+        page = PagedList(self.main_frame)
+        page.pack(pady=5)
+        page.set_rows(len(rows), lambda start, stop: [
+            self.capacity_row_text(num, item) for num, item in rows[start:stop]
+        ])
 
         tk.Button(self.main_frame, text="Back", width=15,
                   command=self.open_admin_dashboard).pack(pady=20)
 
+    def capacity_row_text(self, num, item):
+        if num == 0:
+            return "--- " + item.title + " ---"
+        ws = item
+        reg = len(ws.registered_attendees)
+        cap = ws.max_capacity
+        status = "FULL" if ws.is_full() else "Available"
+        return f"  {ws.title} | {reg}/{cap} | {status}"
+
     def open_upgrade_option(self):
         self.reset_view()
 
@@ -602,30 +942,23 @@ class Conference_GUI:
                          font=("Arial", 14, "bold"))
         title.pack(pady=10)
 
-        self.upgradeable = []
-
-        for att in self.system.attendee_list:
-            for t in att.owned_tickets:
-                if t.category != "All-Access Pass":
-                    self.upgradeable.append((att, t))
+        self.upgradeable = self.system.upgradeable_tickets()
 
         if len(self.upgradeable) == 0:
             tk.Label(self.main_frame, text="No Exhibition Passes to upgrade").pack(pady=10)
         else:
-            list_frame = tk.Frame(self.main_frame)
-            list_frame.pack(pady=10)
-
-            num = 1
-            for att, ticket in self.upgradeable:
-                text = f"{num}. {att.email} | {ticket.id_code} | {ticket.category}"
-                tk.Label(list_frame, text=text).pack(anchor="w")
-                num += 1
+            self.upgrade_page = PagedList(self.main_frame, page_size=15)
+            self.upgrade_page.pack(pady=10)
+            self.upgrade_page.set_rows(len(self.upgradeable), lambda start, stop: [
+                f"{start + i + 1}. {att.email} | {ticket.id_code} | {ticket.category}"
+                for i, (att, ticket) in enumerate(self.upgradeable[start:stop])
+            ])
 
             select_frame = tk.Frame(self.main_frame)
             select_frame.pack(pady=10)
 
-            tk.Label(select_frame, text="Ticket number:").grid(row=0, column=0, pady=5)
-            self.upgrade_ticket_entry = tk.Entry(select_frame, width=10)
+            tk.Label(select_frame, text="Ticket number or ID:").grid(row=0, column=0, pady=5)
+            self.upgrade_ticket_entry = tk.Entry(select_frame, width=14)
             self.upgrade_ticket_entry.grid(row=0, column=1, pady=5)
 
             tk.Label(select_frame, text="Exhibition to add (1/2/3):").grid(row=1, column=0, pady=5)
@@ -655,22 +988,36 @@ class Conference_GUI:
             return
 
         try:
-            t_idx = int(ticket_num) - 1
             e_idx = int(ex_num) - 1
-
-            if t_idx < 0 or t_idx >= len(self.upgradeable):
-                self.upgrade_msg_label.config(text="Error: Invalid ticket number")
-                return
             if e_idx < 0 or e_idx >= len(self.system.exhibition_list):
                 self.upgrade_msg_label.config(text="Error: Invalid exhibition number")
                 return
 
-            att, ticket = self.upgradeable[t_idx]
+            t_idx = None
+            if ticket_num.strip().isdigit():
+                t_idx = int(ticket_num) - 1
+                if t_idx < 0 or t_idx >= len(self.upgradeable):
+                    self.upgrade_msg_label.config(text="Error: Invalid ticket number")
+                    return
+                att, ticket = self.upgradeable[t_idx]
+            else:
+                # a ticket id, as printed on the pass
+                ticket, att = self.system.find_ticket(ticket_num)
+                if ticket is None:
+                    self.upgrade_msg_label.config(text="Error: Ticket not found")
+                    return
+
             ex = self.system.exhibition_list[e_idx]
 
             ok, msg = self.system.perform_ticket_upgrade(att, ticket, ex.title)
             if ok:
                 self.upgrade_msg_label.config(text="Success: " + msg)
+                # only this ticket changed, so only its row is redrawn; a
+                # ticket given by id just redraws the page on show
+                if t_idx is not None:
+                    self.upgrade_page.refresh_row(t_idx)
+                else:
+                    self.upgrade_page.show_page(self.upgrade_page.page)
             else:
                 self.upgrade_msg_label.config(text="Error: " + msg)
         except:
@@ -682,4 +1029,20 @@ class Conference_GUI:
 # =======================
 
 if __name__ == "__main__":
-    app = Conference_GUI()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="GreenWave conference GUI")
+    parser.add_argument("--db", help="SQLite database (default: the .dat files)")
+    parser.add_argument("--kiosk", metavar="SNAPSHOT",
+                        help="run from a snapshot written by snapshot.py, shared with other kiosks")
+    parser.add_argument("--kiosk-db", default="kiosk.db",
+                        help="database the kiosks share for their changes (with --kiosk)")
+    parser.add_argument("--autosave", type=float, default=60, metavar="SECONDS",
+                        help="how often to save in the background (0: only on close)")
+    args = parser.parse_args()
+
+    if args.kiosk:
+        storage = SnapshotStorage(args.kiosk, args.kiosk_db)
+    elif args.db:
+        storage = SQLiteStorage(args.db)
+    else:
+        storage = None
+    app = Conference_GUI(storage, args.autosave)
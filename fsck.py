@@ -0,0 +1,224 @@
+import argparse
+from collections import Counter
+
+from data_classes import Conference_system, ALL_WORKSHOPS, ticket_number
+from storage import SQLiteStorage
+
+
+# =======================
+# VERIFY
+# =======================
+
+def verify(system):
+    """
+    Check the loaded data in one pass over the workshops and one over the
+    attendees. Returns a list of (kind, message); kinds are capacity,
+    dangling, symmetry, ticket, duplicate-id, index, registry, ledger and
+    counter.
+    """
+    problems = []
+    catalog = system.catalog
+    lookup = system.lookup_attendee
+
+    for title, ws in catalog.workshops.items():
+        if len(ws.registered_attendees) > ws.max_capacity:
+            problems.append(("capacity", f"{title}: {len(ws.registered_attendees)} booked, "
+                                         f"capacity {ws.max_capacity}"))
+        for email in ws.registered_attendees:
+            attendee = lookup(email)
+            if attendee is None:
+                problems.append(("symmetry", f"{title}: unknown attendee {email} on the roster"))
+            elif title not in attendee.booked_workshops:
+                problems.append(("symmetry", f"{title}: {email} on the roster but not booked"))
+
+    ticket_ids = set()
+    highest = 0
+    count = 0
+    for attendee in system.attendee_list:
+        count += 1
+        email = attendee.email
+        if not system.storage.lazy and lookup(email) is not attendee:
+            problems.append(("index", f"{email}: missing from the email index"))
+
+        for title in attendee.booked_workshops:
+            ws = catalog.workshops.get(title)
+            if ws is None:
+                problems.append(("dangling", f"{email}: booked unknown workshop {title}"))
+                continue
+            if email not in ws.registered_attendees:
+                problems.append(("symmetry", f"{email}: booked {title} but not on its roster"))
+            if attendee.ticket_for(title) is None:
+                problems.append(("ticket", f"{email}: booked {title} without a ticket for it"))
+
+        for ticket in attendee.owned_tickets:
+            if ticket.id_code in ticket_ids:
+                problems.append(("duplicate-id", f"{email}: duplicate ticket id {ticket.id_code}"))
+            ticket_ids.add(ticket.id_code)
+            highest = max(highest, ticket_number(ticket.id_code))
+            if not system.storage.lazy and system.ticket_registry.get(ticket.id_code) != (ticket, attendee):
+                problems.append(("registry", f"{ticket.id_code}: missing from the ticket registry"))
+
+            if ticket.allowed_workshops is not ALL_WORKSHOPS:
+                for title in ticket.allowed_workshops:
+                    if title not in catalog.workshops:
+                        problems.append(("dangling", f"{ticket.id_code}: opens unknown workshop {title}"))
+            for title in ticket.current_bookings:
+                if title not in attendee.booked_workshops:
+                    problems.append(("ticket", f"{ticket.id_code}: holds a booking for {title} "
+                                               f"that {email} does not have"))
+
+    if not system.storage.lazy and count != len(system.attendee_index):
+        problems.append(("index", f"{count} attendees but {len(system.attendee_index)} "
+                                  f"in the email index"))
+
+    if not system.storage.lazy and len(ticket_ids) != len(system.ticket_registry):
+        problems.append(("registry", f"{len(ticket_ids)} tickets but "
+                                     f"{len(system.ticket_registry)} in the ticket registry"))
+
+    # once loaded, numbers come from the allocator shared by every process
+    # on the same data, so another kiosk's tickets may pass this counter
+    if system.recording:
+        counter, name = system.storage.ticket_ids.high_water_mark(), "ticket id allocator"
+    else:
+        counter, name = system.ticket_counter, "ticket counter"
+    if counter < highest:
+        problems.append(("counter", f"{name} {counter} is below "
+                                    f"the highest ticket number {highest}"))
+
+    problems.extend(_ledger_problems(system))
+    return problems
+
+
+def _ledger_problems(system):
+    problems = []
+    if len(system.sales) != len(system.sales_list):
+        problems.append(("ledger", f"{len(system.sales_list)} sales but "
+                                   f"{len(system.sales)} in the ledger"))
+    ledger = system.sales.daily_totals()
+    for day, total in system.sales_list.daily_totals().items():
+        if abs(ledger.get(day, 0) - total) > 0.005:
+            problems.append(("ledger", f"sales for {day}: {total} AED, "
+                                       f"ledger says {ledger.get(day, 0)} AED"))
+    return problems
+
+
+# =======================
+# REPAIR
+# =======================
+
+def repair(system):
+    """
+    Bring the loaded data back in line, in memory; store it afterwards to
+    keep the result. Bookings without a matching roster entry, ticket or
+    workshop are dropped (or completed when the ticket allows it and
+    there is room), rosters over capacity lose their latest entries,
+    duplicate ticket ids get fresh ids and the index, ledger and ticket
+    counter are rebuilt. Returns a list of what was changed.
+    """
+    changes = []
+    catalog = system.catalog
+
+    system._rebuild_attendee_index()
+    system.ticket_counter = max(system.ticket_counter, system._derive_ticket_counter())
+
+    # roster entries nobody booked go first, so the bookings below can
+    # take their places
+    for title, ws in catalog.workshops.items():
+        for email in list(ws.registered_attendees):
+            attendee = system.lookup_attendee(email)
+            if attendee is None or title not in attendee.booked_workshops:
+                ws.unregister(email)
+                changes.append(f"{title}: removed {email} from the roster")
+
+    ticket_ids = set()
+    for attendee in system.attendee_list:
+        email = attendee.email
+        for ticket in attendee.owned_tickets:
+            if ticket.id_code in ticket_ids:
+                old = ticket.id_code
+                ticket.id_code = system._next_ticket_id(old.rstrip("0123456789").rstrip("-"))
+                changes.append(f"{email}: duplicate ticket id {old} renumbered to {ticket.id_code}")
+            ticket_ids.add(ticket.id_code)
+
+            if ticket.allowed_workshops is not ALL_WORKSHOPS:
+                for title in [t for t in ticket.allowed_workshops if t not in catalog.workshops]:
+                    ticket.remove_allowed_workshop(title)
+                    changes.append(f"{ticket.id_code}: removed unknown workshop {title}")
+
+        for title in list(attendee.booked_workshops):
+            ws = catalog.workshops.get(title)
+            if ws is None:
+                attendee.cancel_booking(title)
+                changes.append(f"{email}: dropped booking for unknown workshop {title}")
+            elif attendee.ticket_for(title) is None:
+                ws.unregister(email)
+                attendee.cancel_booking(title)
+                changes.append(f"{email}: dropped {title}, no ticket covers it")
+            elif email not in ws.registered_attendees:
+                if ws.is_full():
+                    attendee.cancel_booking(title)
+                    changes.append(f"{email}: dropped {title}, missing from its full roster")
+                else:
+                    ws.register(email)
+                    changes.append(f"{email}: added to the roster of {title}")
+
+        for ticket in attendee.owned_tickets:
+            for title in [t for t in ticket.current_bookings if t not in attendee.booked_workshops]:
+                ticket.remove_booking(title)
+            for title in attendee.booked_workshops:
+                if attendee.ticket_for(title) is ticket:
+                    ticket.add_booking(title)
+
+    for title, ws in catalog.workshops.items():
+        # the roster keeps booking order, so the latest bookings go
+        extra = list(ws.registered_attendees)[ws.max_capacity:]
+        for email in extra:
+            attendee = system.lookup_attendee(email)
+            system._unbook(attendee, ws)
+            changes.append(f"{title}: unbooked {email}, over capacity")
+
+    system.schedules.clear()
+    system.access.clear()
+    system.search.clear()
+    # renumbered tickets are filed under their new ids
+    system._rebuild_ticket_registry()
+    if _ledger_problems(system):
+        system.sales.rebuild(system.sales_list)
+        changes.append("rebuilt the sales ledger")
+
+    return changes
+
+
+# =======================
+# COMMAND LINE
+# =======================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check (and repair) GreenWave conference data")
+    parser.add_argument("--db", help="SQLite database (default: the .dat files)")
+    parser.add_argument("--repair", action="store_true", help="fix the problems and save")
+    args = parser.parse_args()
+
+    system = Conference_system(SQLiteStorage(args.db) if args.db else None)
+    system.load_all_data()
+
+    problems = verify(system)
+    for kind, total in sorted(Counter(kind for kind, msg in problems).items()):
+        print(f"{kind:<14} {total}")
+    for kind, msg in problems[:50]:
+        print(f"  [{kind}] {msg}")
+    if len(problems) > 50:
+        print(f"  ... and {len(problems) - 50} more")
+
+    if args.repair and problems:
+        changes = repair(system)
+        if isinstance(system.storage, SQLiteStorage):
+            # a normal store only writes the catalog to the database
+            with system.gate.exclusive():
+                system.storage.rewrite(system)
+        else:
+            system.store_all_data()
+        print(f"{len(changes)} changes saved; {len(verify(system))} problems left")
+    elif not problems:
+        print("No problems found.")
+    system.storage.close()
@@ -0,0 +1,103 @@
+import os
+import threading
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+# =======================
+# FILE LOCK
+# =======================
+
+def _lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+# =======================
+# TICKET ID ALLOCATOR
+# =======================
+
+class TicketIdAllocator:
+    """
+    Hands out ticket numbers that stay unique across restarts and across
+    processes sharing the same data folder. The file holds the next free
+    number; a process locks it, takes a block of block_size numbers and
+    then issues from that block in memory, so the file is touched once
+    per block instead of once per sale. Numbers left in a block when a
+    process stops are skipped, never reused.
+    """
+
+    WIDTH = 20      # the number is rewritten in place at a fixed width
+
+    def __init__(self, filename="ticket_ids.dat", block_size=1000):
+        self.filename = filename
+        self.block_size = block_size
+        self.next_number = 0
+        self.block_end = 0
+        self.lock = threading.Lock()
+
+    def _update_file(self, change):
+        """Run change(next free number) -> new next free number under the file lock."""
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock(fd)
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                text = os.read(fd, self.WIDTH + 1).strip()
+                if text == b"":
+                    current = 1
+                elif text.isdigit():
+                    current = int(text)
+                else:
+                    raise ValueError(self.filename + " does not hold a ticket number")
+
+                new = change(current)
+                if new != current:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.write(fd, b"%0*d\n" % (self.WIDTH, new))
+                    os.fsync(fd)
+                return current
+            finally:
+                _unlock(fd)
+        finally:
+            os.close(fd)
+
+    def take(self, count=1):
+        """Reserve count consecutive numbers; returns the first."""
+        with self.lock:
+            if self.block_end - self.next_number < count:
+                size = max(count, self.block_size)
+                self.next_number = self._update_file(lambda current: current + size)
+                self.block_end = self.next_number + size
+            first = self.next_number
+            self.next_number += count
+            return first
+
+    def high_water_mark(self):
+        """The highest number any process sharing the file may have taken so far."""
+        with self.lock:
+            return self._update_file(lambda current: current) - 1
+
+    def advance_to(self, number):
+        """Make sure no number up to and including number is handed out."""
+        with self.lock:
+            self._update_file(lambda current: max(current, number + 1))
+            if self.next_number <= number:
+                self.next_number = self.block_end = 0
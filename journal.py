@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+from datafile import (
+    DataFileError,
+    FRAME,
+    MAGIC,
+    PICKLE_START,
+    file_header,
+    frame_bytes,
+    read_header,
+)
+
+
+# =======================
+# JOURNAL CLASS
+# =======================
+
+class Journal:
+    """
+    Append-only log of domain events written next to the .dat snapshot.
+    Events are buffered and written + fsync'd in batches, so a crash
+    loses at most the last unsynced batch instead of the whole session.
+
+    The file has the header of datafile.py and one checksummed "J" frame
+    per batch, holding [sequence number of its first event, events]. The
+    numbers keep counting across clear(), so a snapshot can record the
+    last event it holds and replay skip everything up to it.
+    """
+
+    def __init__(self, filename="journal.dat", batch_size=32, batch_interval=1.0):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.pending = []
+        self.synced_count = 0
+        self.last_seq = 0
+        self.last_sync = time.monotonic()
+        self._file = None
+        # several booking threads may append at once
+        self.lock = threading.RLock()
+
+    def append(self, event):
+        with self.lock:
+            self.pending.append(event)
+            self.last_seq += 1
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+            elif time.monotonic() - self.last_sync >= self.batch_interval:
+                self.flush()
+
+    def extend(self, events):
+        """Append several events and write them out as one batch."""
+        with self.lock:
+            self.pending.extend(events)
+            self.last_seq += len(events)
+            self.flush()
+
+    def _open(self):
+        self._file = open(self.filename, "ab")
+        if self._file.tell() == 0:
+            self._file.write(file_header("journal"))
+
+    def flush(self):
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+            if self._file is None:
+                self._open()
+
+            first_seq = self.last_seq - len(self.pending) + 1
+            payload = json.dumps([first_seq, self.pending], separators=(",", ":")).encode()
+            self._file.write(frame_bytes(b"J", payload))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            self.synced_count += len(self.pending)
+            self.pending = []
+            self.last_sync = time.monotonic()
+
+    def read_events(self, after=0):
+        """
+        The events in the file numbered above after; the numbering of new
+        events carries on from the last one. A batch cut short by a crash
+        at the end of the file is dropped and cut off; damage anywhere
+        before that raises DataFileError, since the events after it would
+        be lost.
+        """
+        self.last_seq = after
+        self.synced_count = 0
+        try:
+            f = open(self.filename, "rb")
+        except FileNotFoundError:
+            return []
+
+        events = []
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return events
+            if f.read(len(MAGIC)).startswith(PICKLE_START):
+                raise DataFileError(f"{self.filename}: journal from before the checksummed "
+                                    f"format; convert it with datafile.py")
+            f.seek(0)
+            if read_header(f, self.filename) != "journal":
+                raise DataFileError(self.filename + ": not a journal")
+
+            good_end = f.tell()
+            while good_end < size:
+                head = f.read(FRAME.size)
+                if len(head) < FRAME.size:
+                    break
+                kind, length, crc = FRAME.unpack(head)
+                end = good_end + FRAME.size + length
+                if end > size:
+                    break
+                payload = f.read(length)
+                if kind != b"J" or zlib.crc32(payload) != crc:
+                    if end == size:
+                        # the last batch, written only in part
+                        break
+                    raise DataFileError(f"{self.filename}: damaged batch at byte {good_end}")
+                first_seq, batch = json.loads(payload)
+                for seq, event in enumerate(batch, first_seq):
+                    if seq > after:
+                        events.append(tuple(event))
+                self.last_seq = max(self.last_seq, first_seq + len(batch) - 1)
+                self.synced_count += len(batch)
+                good_end = end
+
+        # cut off a half-written batch from a crash so new events
+        # are not appended after garbage
+        if good_end < size:
+            os.truncate(self.filename, good_end)
+        return events
+
+    def clear(self):
+        """
+        Drop every event; called once they are folded into the snapshot.
+        New events go on numbering from last_seq.
+        """
+        with self.lock:
+            self.pending = []
+            self.close()
+            with open(self.filename, "wb") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.synced_count = 0
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return self.synced_count + len(self.pending)
@@ -0,0 +1,220 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def format_daily_report(totals):
+    lines = ["Date       | Amount", "----------------------"]
+    for d in totals:
+        lines.append(f"{d} | {totals[d]} AED")
+    return "\n".join(lines) + "\n"
+
+
+# =======================
+# SALES COLUMNS
+# =======================
+
+class SalesColumns:
+    """
+    Column store for the sales stream, used as Conference_system.sales_list.
+    Each sale costs 14 bytes: the day as a date ordinal, the category as a
+    code into a small table of names and the amount in integer fils.
+    It still appends and iterates (date, category, amount) tuples like
+    the list it replaces.
+    """
+
+    def __init__(self, sales=()):
+        self.day_numbers = array("i")
+        self.category_codes = array("H")
+        self.amounts = array("q")
+        self.categories = []
+        self.category_ids = {}
+        self._day_numbers = {}
+        for sale in sales:
+            self.append(sale)
+
+    def _day_number(self, day):
+        num = self._day_numbers.get(day)
+        if num is None:
+            num = date.fromisoformat(day).toordinal()
+            self._day_numbers[day] = num
+        return num
+
+    def _category_code(self, category):
+        code = self.category_ids.get(category)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(category)
+            self.category_ids[category] = code
+        return code
+
+    def append(self, sale):
+        day, category, amount = sale
+        self.day_numbers.append(self._day_number(day))
+        self.category_codes.append(self._category_code(category))
+        self.amounts.append(round(amount * 100))
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __getitem__(self, i):
+        return (date.fromordinal(self.day_numbers[i]).isoformat(),
+                self.categories[self.category_codes[i]],
+                self.amounts[i] / 100)
+
+    def __iter__(self):
+        names = {}
+        for num, code, fils in zip(self.day_numbers, self.category_codes, self.amounts):
+            day = names.get(num)
+            if day is None:
+                day = date.fromordinal(num).isoformat()
+                names[num] = day
+            yield day, self.categories[code], fils / 100
+
+    def count(self, category):
+        code = self.category_ids.get(category)
+        return 0 if code is None else self.category_codes.count(code)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_day_numbers"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._day_numbers = {}
+
+    # ------------ GROUP BY ------------
+
+    def _group(self, keys, mask=None):
+        """Sum amounts (in fils) per key, returning {key: fils} in first-seen order."""
+        if numpy is not None and len(keys) > 0:
+            k = numpy.frombuffer(keys, dtype=numpy.uint16 if keys.typecode == "H" else numpy.int32)
+            amounts = numpy.frombuffer(self.amounts, dtype=numpy.int64)
+            if mask is not None:
+                k = k[mask]
+                amounts = amounts[mask]
+            if len(k) == 0:
+                return {}
+            # keys are dense (day ordinals, category codes), so offsets
+            # from the smallest key index straight into the result arrays
+            low = int(k.min())
+            offsets = k.astype(numpy.int64) - low
+            size = int(offsets.max()) + 1
+            sums = numpy.zeros(size, dtype=numpy.int64)
+            numpy.add.at(sums, offsets, amounts)
+            first = numpy.full(size, len(k), dtype=numpy.int64)
+            numpy.minimum.at(first, offsets, numpy.arange(len(k)))
+            present = numpy.nonzero(first < len(k))[0]
+            present = present[numpy.argsort(first[present], kind="stable")]
+            return {int(i) + low: int(sums[i]) for i in present}
+
+        totals = {}
+        if mask is None:
+            for key, fils in zip(keys, self.amounts):
+                totals[key] = totals.get(key, 0) + fils
+        else:
+            for key, fils, keep in zip(keys, self.amounts, mask):
+                if keep:
+                    totals[key] = totals.get(key, 0) + fils
+        return totals
+
+    def _category_mask(self, category):
+        code = self.category_ids.get(category, -1)
+        if numpy is not None:
+            return numpy.frombuffer(self.category_codes, dtype=numpy.uint16) == code
+        return [c == code for c in self.category_codes]
+
+    def daily_totals(self, category=None):
+        mask = None if category is None else self._category_mask(category)
+        grouped = self._group(self.day_numbers, mask)
+        return {date.fromordinal(num).isoformat(): fils / 100 for num, fils in grouped.items()}
+
+    def category_totals(self):
+        grouped = self._group(self.category_codes)
+        return {self.categories[code]: fils / 100 for code, fils in grouped.items()}
+
+    def revenue_over_time(self):
+        """Cumulative revenue per day, in date order: [(date, total so far)]."""
+        grouped = self._group(self.day_numbers)
+        running = 0
+        result = []
+        for num in sorted(grouped):
+            running += grouped[num]
+            result.append((date.fromordinal(num).isoformat(), running / 100))
+        return result
+
+
+# =======================
+# SALES LEDGER
+# =======================
+
+class SalesLedger:
+    """
+    Running totals over the (date, category, amount) sales stream, kept
+    up to date as sales are appended so reports cost O(days), not O(sales).
+    """
+
+    def __init__(self):
+        self.by_day = {}              # date -> total, in first-seen order
+        self.by_category = {}         # category -> total
+        self.by_day_category = {}     # date -> {category -> total}
+        self.days = []                # sorted dates, for range queries
+        self.count = 0
+
+    def add(self, day, category, amount):
+        if day not in self.by_day:
+            self.by_day[day] = 0
+            self.by_day_category[day] = {}
+            insort(self.days, day)
+        self.by_day[day] += amount
+
+        self.by_category.setdefault(category, 0)
+        self.by_category[category] += amount
+
+        day_totals = self.by_day_category[day]
+        day_totals.setdefault(category, 0)
+        day_totals[category] += amount
+        self.count += 1
+
+    def rebuild(self, sales_list):
+        self.__init__()
+        for day, category, amount in sales_list:
+            self.add(day, category, amount)
+
+    def _days_between(self, date_from, date_to):
+        lo = 0 if date_from is None else bisect_left(self.days, date_from)
+        hi = len(self.days) if date_to is None else bisect_right(self.days, date_to)
+        return self.days[lo:hi]
+
+    def daily_totals(self, date_from=None, date_to=None, category=None):
+        """Per-day totals, optionally limited to a date range and one category."""
+        if date_from is None and date_to is None and category is None:
+            return dict(self.by_day)
+
+        totals = {}
+        for day in self._days_between(date_from, date_to):
+            if category is None:
+                totals[day] = self.by_day[day]
+            elif category in self.by_day_category[day]:
+                totals[day] = self.by_day_category[day][category]
+        return totals
+
+    def category_totals(self, date_from=None, date_to=None):
+        if date_from is None and date_to is None:
+            return dict(self.by_category)
+
+        totals = {}
+        for day in self._days_between(date_from, date_to):
+            for category, amount in self.by_day_category[day].items():
+                totals.setdefault(category, 0)
+                totals[category] += amount
+        return totals
+
+    def __len__(self):
+        return self.count
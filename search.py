@@ -0,0 +1,321 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from itertools import compress, islice, repeat, tee
+from operator import contains
+
+
+def _grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _set_bit(bits, number, on):
+    byte = number >> 3
+    if byte >= len(bits):
+        if not on:
+            return
+        bits.extend(bytes(byte - len(bits) + 1024))
+    if on:
+        bits[byte] |= 1 << (number & 7)
+    else:
+        bits[byte] &= ~(1 << (number & 7)) & 0xFF
+
+
+def _set_bits(value, skip, count, chunk=512):
+    """The positions of the set bits of value, skipping the first skip of them."""
+    data = value.to_bytes((value.bit_length() + 7) // 8, "little")
+    found = []
+    for start in range(0, len(data), chunk):
+        part = int.from_bytes(data[start:start + chunk], "little")
+        ones = part.bit_count()
+        # whole chunks are skipped by their count, without walking the bits
+        if skip >= ones:
+            skip -= ones
+            continue
+        while part and len(found) < count:
+            low = part & -part
+            part ^= low
+            if skip > 0:
+                skip -= 1
+            else:
+                found.append(start * 8 + low.bit_length() - 1)
+        if len(found) >= count:
+            break
+    return found
+
+
+def _flags(value, length):
+    """One byte per number, 1 where value has the bit set."""
+    flags = bin(value)[:1:-1].encode().translate(_BINARY_DIGITS)
+    return flags[:length].ljust(length, b"\0")
+
+
+_BINARY_DIGITS = bytes.maketrans(b"01", b"\0\1")
+
+
+def _keep(numbers, column, test=None, arg=None):
+    """
+    The numbers n for which test(column[n], arg) holds, or column[n] is
+    set when there is no test, without a Python call per number.
+    """
+    if isinstance(numbers, range):
+        values = column
+    else:
+        if not isinstance(numbers, (array, list)):
+            # a one-pass walk, so it is split in two
+            numbers, looked_up = tee(numbers)
+        else:
+            looked_up = numbers
+        values = map(column.__getitem__, looked_up)
+    if test is not None:
+        values = map(test, values, repeat(arg))
+    return compress(numbers, values)
+
+
+def _page(matches, offset, limit, count):
+    """(matches offset to offset + limit, how many there are or None when count is False)."""
+    matches = iter(matches)
+    first = list(islice(matches, offset + limit))
+    if not count:
+        return first[offset:], None
+    return first[offset:], len(first) + sum(1 for item in matches)
+
+
+# =======================
+# SEARCH INDEX
+# =======================
+
+class SearchIndex:
+    """
+    Indexes behind the admin search. Every attendee gets a number in
+    registration order and the index only holds email keys, so it works
+    the same with the lazy storages:
+      - email prefix: the keys in sorted order, plus a small sorted list
+        of recent ones that is merged in every MERGE_AT registrations
+      - name substring: lists of numbers per three-letter piece of the
+        lower-case name (names do not change, so the lists stay sorted)
+      - ticket id: id -> number
+      - category and workshop: a bitmap of numbers per category / title
+    It is built on the first search and kept up to date after that.
+    """
+
+    MERGE_AT = 16384
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget everything; the next search builds the index again."""
+        self.built = False
+        self.keys = []              # number -> email key
+        self.names = []             # number -> lower-case name
+        self.numbers = {}           # email key -> number
+        self.sorted_keys = []
+        self.recent_keys = []
+        self.grams = {}             # three letters -> array of numbers
+        self.tickets = {}           # ticket id -> number
+        self.categories = {}        # category -> bitmap
+        self.workshops = {}         # workshop title -> bitmap
+
+    # ------------ UPDATES ------------
+
+    def _add(self, key, attendee):
+        number = len(self.keys)
+        self.keys.append(key)
+        name = attendee.full_name.lower()
+        self.names.append(name)
+        self.numbers[key] = number
+        for gram in _grams(name):
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array("i")
+            postings.append(number)
+        self._set_tickets(number, attendee)
+        for title in attendee.booked_workshops:
+            _set_bit(self.workshops.setdefault(title, bytearray()), number, True)
+        return number
+
+    def _set_tickets(self, number, attendee):
+        held = set()
+        for ticket in attendee.owned_tickets:
+            held.add(ticket.category)
+            self.tickets[ticket.id_code] = number
+        for category in held:
+            self.categories.setdefault(category, bytearray())
+        for category, bits in self.categories.items():
+            _set_bit(bits, number, category in held)
+
+    def build(self, attendees, email_key):
+        with self.lock:
+            self.clear()
+            for attendee in attendees:
+                key = email_key(attendee.email)
+                if key not in self.numbers:
+                    self._add(key, attendee)
+            self.sorted_keys = sorted(self.keys)
+            self.built = True
+
+    def add(self, key, attendee):
+        with self.lock:
+            if not self.built or key in self.numbers:
+                return
+            self._add(key, attendee)
+            insort(self.recent_keys, key)
+            if len(self.recent_keys) >= self.MERGE_AT:
+                # two sorted runs, which sort() merges in one pass
+                self.sorted_keys.extend(self.recent_keys)
+                self.sorted_keys.sort()
+                self.recent_keys = []
+
+    def tickets_changed(self, key, attendee, removed=()):
+        with self.lock:
+            number = self.numbers.get(key)
+            if number is None:
+                return
+            for id_code in removed:
+                self.tickets.pop(id_code, None)
+            self._set_tickets(number, attendee)
+
+    def booking_changed(self, key, title, booked):
+        with self.lock:
+            number = self.numbers.get(key)
+            if number is not None:
+                _set_bit(self.workshops.setdefault(title, bytearray()), number, booked)
+
+    # ------------ SEARCH ------------
+
+    def _prefix_ranges(self, prefix):
+        ranges = []
+        for sorted_keys in (self.sorted_keys, self.recent_keys):
+            start = bisect_left(sorted_keys, prefix)
+            end = bisect_left(sorted_keys, prefix + "\uffff", start)
+            ranges.append((sorted_keys, start, end))
+        return ranges
+
+    def _walk_prefix(self, ranges):
+        """The keys in the ranges in sorted order, one at a time."""
+        runs = [map(keys.__getitem__, range(start, end)) for keys, start, end in ranges if start < end]
+        return runs[0] if len(runs) == 1 else heapq.merge(*runs)
+
+    def _prefix_page(self, ranges, offset, limit):
+        # the page is among the first offset + limit keys of each range,
+        # and sorting two sorted runs is one merge
+        keys = []
+        for sorted_keys, start, end in ranges:
+            keys.extend(sorted_keys[start:min(end, start + offset + limit)])
+        if len(self.recent_keys) > 0:
+            keys.sort()
+        return keys[offset:offset + limit]
+
+    def _outside_prefix(self, ranges, flags):
+        """How many of the numbers flagged have a key outside the ranges."""
+        found = 0
+        for sorted_keys, start, end in ranges:
+            for part in (sorted_keys[:start], sorted_keys[end:]):
+                found += sum(map(flags.__getitem__, map(self.numbers.__getitem__, part)))
+        return found
+
+    def _name_candidates(self, text):
+        """A sorted run of numbers holding every name with text in it, or None for all."""
+        grams = _grams(text)
+        if len(grams) == 0:
+            # one or two letters: no piece to look up, so every name is checked
+            return None
+        postings = []
+        for gram in grams:
+            found = self.grams.get(gram)
+            if found is None:
+                return array("i")
+            postings.append(found)
+        # the rarest piece gives the fewest names to check
+        return min(postings, key=len)
+
+    def search(self, email_prefix="", name="", ticket_id="", category="", workshop="",
+               offset=0, limit=20, count=True):
+        """
+        Email keys of the attendees matching every filter given, as
+        (keys from offset to offset + limit, total matches). Results are
+        in registration order, or by email when an email prefix is given.
+        The matches are walked one at a time from the smallest filter and
+        the other filters are tested on each. With count=False the walk
+        stops at the end of the page and the total is None, unless the
+        bitmaps or the sorted keys give it without walking.
+        """
+        with self.lock:
+            email_prefix = email_prefix.strip().lower()
+            name = name.strip().lower()
+            # the smallest source of candidate numbers drives the walk
+            driver = None
+            size = len(self.keys)
+
+            number = None
+            if ticket_id:
+                number = self.tickets.get(ticket_id.strip().upper())
+                if number is None:
+                    return [], 0
+                driver, size = [number], 1
+            if name:
+                candidates = self._name_candidates(name)
+                if candidates is not None and len(candidates) < size:
+                    driver, size = candidates, len(candidates)
+            flags = None
+            if category or workshop:
+                bits = -1
+                if category:
+                    bits &= int.from_bytes(self.categories.get(category, b""), "little")
+                if workshop:
+                    bits &= int.from_bytes(self.workshops.get(workshop, b""), "little")
+                ones = bits.bit_count()
+                if driver is None and not name and not email_prefix:
+                    # a bitmap alone: whole chunks are skipped by their count
+                    return [self.keys[n] for n in _set_bits(bits, offset, limit)], ones
+                flags = _flags(bits, len(self.keys))
+                if ones < size:
+                    driver, size = compress(range(len(flags)), flags), ones
+
+            def narrow(numbers):
+                # every filter but the email prefix
+                if number is not None:
+                    numbers = filter(number.__eq__, numbers)
+                if name:
+                    numbers = _keep(numbers, self.names, contains, name)
+                if flags is not None:
+                    numbers = _keep(numbers, flags)
+                return numbers
+
+            if driver is None:
+                if not email_prefix and not name and flags is None:
+                    return self.keys[offset:offset + limit], len(self.keys)
+                driver = range(len(self.keys))
+            if not email_prefix:
+                page, total = _page(narrow(driver), offset, limit, count)
+                return [self.keys[n] for n in page], total
+
+            ranges = self._prefix_ranges(email_prefix)
+            in_range = sum(end - start for keys, start, end in ranges)
+            if number is None and not name and flags is None:
+                return self._prefix_page(ranges, offset, limit), in_range
+            if size * 8 < in_range:
+                # few candidates: check each, then sort them by email
+                keys = sorted(self.keys[n] for n in narrow(driver)
+                              if self.keys[n].startswith(email_prefix))
+                return keys[offset:offset + limit], len(keys)
+
+            walk = map(self.numbers.__getitem__, self._walk_prefix(ranges))
+            # the rest of the prefix is only walked for the count when it
+            # is much shorter than the other filters, as looking up each
+            # key costs more than testing a number
+            page, total = _page(narrow(walk), offset, limit, count and in_range * 4 < size)
+            page = [self.keys[n] for n in page]
+            if not count or total is not None:
+                return page, total
+            if flags is not None and not name and number is None and in_range > len(self.keys) // 2:
+                # most keys have the prefix: the bitmap counts them, less
+                # the few outside it
+                return page, ones - self._outside_prefix(ranges, flags)
+            # the order does not matter for the count, so it runs over the
+            # numbers of the smallest filter instead
+            found = _keep(narrow(driver), self.keys, str.startswith, email_prefix)
+            return page, sum(1 for n in found)
@@ -0,0 +1,373 @@
+import argparse
+import asyncio
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urlsplit, parse_qs
+
+from data_classes import Conference_system, Attendee, AllAccessPass
+from storage import SQLiteStorage
+
+
+# =======================
+# JSON HELPERS
+# =======================
+
+def ticket_to_dict(ticket):
+    data = {
+        "id_code": ticket.id_code,
+        "category": ticket.category,
+        "cost": ticket.cost,
+        "purchase_date": ticket.purchase_date,
+    }
+    if not isinstance(ticket, AllAccessPass):
+        data["exhibitions"] = list(ticket.exhibitions)
+    return data
+
+
+def attendee_to_dict(attendee):
+    return {
+        "email": attendee.email,
+        "full_name": attendee.full_name,
+        "tickets": [ticket_to_dict(t) for t in attendee.owned_tickets],
+        "booked_workshops": list(attendee.booked_workshops),
+    }
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+
+# =======================
+# CONFERENCE SERVICE
+# =======================
+
+class ConferenceService:
+    """
+    The actions of Conference_GUI as JSON endpoints. Every call into
+    Conference_system runs on a worker thread: the system's own
+    per-workshop locks keep bookings for the same workshop in order and
+    the journal's fsync never blocks the event loop.
+    """
+
+    def __init__(self, system, workers=8):
+        self.system = system
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.routes = {
+            ("POST", "/register"): self.register,
+            ("POST", "/login"): self.login,
+            ("POST", "/tickets/exhibition"): self.buy_exhibition_pass,
+            ("POST", "/tickets/all-access"): self.buy_all_access_pass,
+            ("POST", "/tickets/cancel"): self.cancel_ticket,
+            ("POST", "/bookings"): self.book_workshop,
+            ("POST", "/bookings/cancel"): self.cancel_booking,
+            ("POST", "/upgrades"): self.upgrade_ticket,
+            ("POST", "/check-in"): self.check_in,
+            ("GET", "/workshops"): self.list_workshops,
+            ("GET", "/reports/daily"): self.daily_report,
+            ("GET", "/reports/categories"): self.category_report,
+            ("GET", "/reports/waitlists"): self.waitlist_report,
+            ("GET", "/reports/conflicts"): self.conflict_report,
+        }
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def _field(self, body, name, kind=str):
+        value = body.get(name)
+        if value is None or value == "":
+            raise RequestError(400, "Missing field: " + name)
+        return self._checked(name, value, kind)
+
+    def _optional_field(self, body, name, kind=str):
+        value = body.get(name)
+        if value is None:
+            return None
+        return self._checked(name, value, kind)
+
+    def _checked(self, name, value, kind):
+        # a badly typed field would otherwise fail deep inside the system
+        if not isinstance(value, kind):
+            raise RequestError(400, f"{name} must be {FIELD_TYPES[kind]}")
+        return value
+
+    async def _attendee(self, body):
+        # with lazy SQLite storage a lookup can hit the database
+        attendee = await self._run(self.system.lookup_attendee, self._field(body, "email"))
+        if attendee is None:
+            raise RequestError(404, "Email not found")
+        if not attendee.verify_password(self._field(body, "password")):
+            raise RequestError(403, "Wrong password")
+        return attendee
+
+    # ------------ ATTENDEE ------------
+
+    async def register(self, body, query):
+        email = self._field(body, "email")
+        if "@" not in email:
+            raise RequestError(400, "Invalid email")
+        attendee = Attendee(email, self._field(body, "full_name"), self._field(body, "password"))
+        if not await self._run(self.system.add_attendee, attendee):
+            raise RequestError(409, "Email already exists")
+        return 201, attendee_to_dict(attendee)
+
+    async def login(self, body, query):
+        return 200, attendee_to_dict(await self._attendee(body))
+
+    # ------------ TICKETS ------------
+
+    async def buy_exhibition_pass(self, body, query):
+        attendee = await self._attendee(body)
+        titles = self._field(body, "exhibitions", list)
+        if len(titles) == 0:
+            raise RequestError(400, "exhibitions must name at least one exhibition")
+        exhibition_titles = []
+        workshop_titles = []
+        for title in titles:
+            self._checked("each exhibition", title, str)
+            ex = self.system.catalog.find_exhibition(title)
+            if ex is None:
+                raise RequestError(404, "Exhibition not found: " + title)
+            exhibition_titles.append(ex.title)
+            workshop_titles.extend(ws.title for ws in ex.workshop_list)
+
+        ticket = await self._run(self.system.issue_exhibition_pass,
+                                 attendee, exhibition_titles, workshop_titles)
+        return 201, ticket_to_dict(ticket)
+
+    async def buy_all_access_pass(self, body, query):
+        attendee = await self._attendee(body)
+        ticket = await self._run(self.system.issue_all_access_pass, attendee)
+        return 201, ticket_to_dict(ticket)
+
+    async def cancel_ticket(self, body, query):
+        attendee = await self._attendee(body)
+        ok, msg = await self._run(self.system.cancel_ticket,
+                                  attendee, self._field(body, "ticket_id"))
+        if not ok:
+            raise RequestError(409, msg)
+        return 200, {"message": msg}
+
+    # ------------ BOOKING / UPGRADE ------------
+
+    async def book_workshop(self, body, query):
+        attendee = await self._attendee(body)
+        ok, msg = await self._run(self.system.process_workshop_reservation,
+                                  attendee, self._field(body, "workshop"),
+                                  bool(self._optional_field(body, "waitlist", bool)))
+        if not ok:
+            raise RequestError(409, msg)
+        return 201, {"message": msg}
+
+    async def cancel_booking(self, body, query):
+        attendee = await self._attendee(body)
+        ok, msg = await self._run(self.system.cancel_booking,
+                                  attendee, self._field(body, "workshop"))
+        if not ok:
+            raise RequestError(409, msg)
+        return 200, {"message": msg}
+
+    async def upgrade_ticket(self, body, query):
+        attendee = await self._attendee(body)
+        ticket_id = self._field(body, "ticket_id")
+        exhibition = self._field(body, "exhibition")
+
+        # the tickets list is changed by the worker threads, so it is only
+        # read there, never on the event loop
+        def upgrade():
+            ticket = self.system._find_owned_ticket(attendee, ticket_id)
+            if ticket is None:
+                return 404, "Ticket not found"
+            ok, msg = self.system.perform_ticket_upgrade(attendee, ticket, exhibition)
+            return (200, ticket_to_dict(ticket)) if ok else (409, msg)
+
+        status, result = await self._run(upgrade)
+        if status != 200:
+            raise RequestError(status, result)
+        return 200, result
+
+    # ------------ CHECK-IN ------------
+
+    async def check_in(self, body, query):
+        """
+        One scan {"ticket_id", "workshop"} or a batch {"scans": [...]} of
+        them; "workshop" is left out at the entrance. A batch answers 200
+        with one result per scan, in order.
+        """
+        scans = body.get("scans")
+        if scans is None:
+            ok, msg = await self._run(self.system.check_in, self._field(body, "ticket_id"),
+                                      self._optional_field(body, "workshop"))
+            if not ok:
+                raise RequestError(409, msg)
+            return 200, {"message": msg}
+
+        if not isinstance(scans, list):
+            raise RequestError(400, "scans must be a list")
+        pairs = []
+        for scan in scans:
+            if not isinstance(scan, dict):
+                raise RequestError(400, "each scan must be an object")
+            pairs.append((self._field(scan, "ticket_id"), self._optional_field(scan, "workshop")))
+        results = await self._run(self.system.check_in_many, pairs)
+        return 200, [{"ok": ok, "message": msg} for ok, msg in results]
+
+    # ------------ CATALOG / REPORTS ------------
+
+    async def list_workshops(self, body, query):
+        result = []
+        for ex in self.system.exhibition_list:
+            for ws in ex.workshop_list:
+                result.append({
+                    "exhibition": ex.title,
+                    "title": ws.title,
+                    "schedule": ws.schedule,
+                    "available": ws.get_available_spots(),
+                    "max_capacity": ws.max_capacity,
+                })
+        return 200, result
+
+    async def daily_report(self, body, query):
+        totals = self.system.sales.daily_totals(query.get("from"), query.get("to"),
+                                                query.get("category"))
+        return 200, totals
+
+    async def category_report(self, body, query):
+        return 200, self.system.sales_by_category(query.get("from"), query.get("to"))
+
+    async def waitlist_report(self, body, query):
+        return 200, self.system.waitlist_stats()
+
+    async def conflict_report(self, body, query):
+        try:
+            limit = int(query.get("limit", 100))
+        except ValueError:
+            raise RequestError(400, "limit must be a number")
+        if limit < 0:
+            raise RequestError(400, "limit must not be negative")
+        # a full scan of every booking, so keep it off the event loop
+        rows = await self._run(lambda: list(islice(self.system.schedule_conflicts(), limit)))
+        return 200, [{"email": e, "workshop": a, "overlaps": b} for e, a, b in rows]
+
+    # ------------ HTTP ------------
+
+    async def handle(self, method, target, body_bytes):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            return 404, {"error": "Not found"}
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            body = json.loads(body_bytes) if body_bytes else {}
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return 400, {"error": "Invalid JSON"}
+        if not isinstance(body, dict):
+            return 400, {"error": "Body must be a JSON object"}
+
+        try:
+            return await handler(body, query)
+        except RequestError as e:
+            return e.status, {"error": e.message}
+        except Exception:
+            # a bug in a handler still gets an answer instead of a dropped
+            # connection
+            traceback.print_exc()
+            return 500, {"error": "Internal error"}
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                status, data = await self.handle(method, target, body)
+                payload = json.dumps(data).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        return await asyncio.start_server(self.serve_connection, host, port)
+
+
+FIELD_TYPES = {
+    str: "text",
+    list: "a list",
+    bool: "true or false",
+}
+
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    409: "Conflict",
+    500: "Internal Server Error",
+}
+
+
+# =======================
+# RUN SERVER
+# =======================
+
+async def main(args):
+    storage = SQLiteStorage(args.db, lazy=args.lazy) if args.db else None
+    system = Conference_system(storage)
+    system.load_all_data()
+    system.create_default_exhibition()
+
+    service = ConferenceService(system, args.workers)
+    server = await service.start(args.host, args.port)
+    print(f"GreenWave service listening on http://{args.host}:{args.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.executor.shutdown()
+        system.store_all_data()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GreenWave conference HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--db", help="SQLite database (default: the .dat files)")
+    parser.add_argument("--lazy", action="store_true", help="load attendees on demand (needs --db)")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
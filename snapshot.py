@@ -0,0 +1,726 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sqlite3
+import sys
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+
+import datafile
+from datafile import DataFileError
+from data_classes import Conference_system, Attendee, Exhibition, Workshop, OrderedSet, ticket_number
+from id_allocator import TicketIdAllocator
+from sales import SalesColumns
+from storage import SQLiteStorage
+
+
+# =======================
+# FILE LAYOUT
+# =======================
+#
+#   header    see HEADER below
+#   records   one per attendee: key length:u16 row length:u32 crc32:u32,
+#             the email key, then the attendee row of datafile.py as JSON
+#   table     slots x (crc32 of the email key:u32, record offset:u64),
+#             open addressing with linear probing; offset 0 is an empty slot
+#   tickets   the same kind of table keyed by the crc32 of each ticket id,
+#             pointing at the record of the ticket's owner
+#   catalog   JSON: a random id for the snapshot, the symbol table,
+#             exhibitions with their workshops and rosters, and the sales
+#             categories
+#   sales     the three sales columns as raw little-endian arrays
+#
+# Nothing has to be read up front except the header and the catalog, so
+# a process maps the file and finds an attendee with a few slot reads.
+# Processes on the same host share the pages through the page cache.
+
+MAGIC = b"GWSNP"
+VERSION = 2
+HEADER = struct.Struct("<5sHIIQQQQIQQIQ")
+RECORD = struct.Struct("<HII")
+SLOT = struct.Struct("<IQ")
+
+
+def _email_key(email):
+    return email.strip().lower()
+
+
+# =======================
+# WRITING
+# =======================
+
+class _Symbols:
+    """The symbol()/symbol_list() half of datafile's writer."""
+
+    def __init__(self):
+        self.numbers = {}
+        self.names = []
+
+    def symbol(self, text):
+        number = self.numbers.get(text)
+        if number is None:
+            number = len(self.names)
+            self.numbers[text] = number
+            self.names.append(text)
+        return number
+
+    def symbol_list(self, items):
+        return [self.symbol(t) for t in items]
+
+
+def _table(entries):
+    slots = 8
+    while slots < 2 * len(entries):
+        slots *= 2
+    mask = slots - 1
+    table = bytearray(slots * SLOT.size)
+    for crc, offset in entries:
+        i = crc & mask
+        while SLOT.unpack_from(table, i * SLOT.size)[1] != 0:
+            i = (i + 1) & mask
+        SLOT.pack_into(table, i * SLOT.size, crc, offset)
+    return slots, table
+
+
+def write_snapshot(filename, attendees, exhibitions, sales):
+    """
+    Write a snapshot of attendees, exhibitions and sales to filename, via a
+    .tmp file that is fsynced and renamed, like the .dat files. Processes
+    that still map the old file keep reading it until they reopen.
+    """
+    if not isinstance(sales, SalesColumns):
+        sales = SalesColumns(sales)
+    symbols = _Symbols()
+    entries = []
+    ticket_entries = []
+    seen = set()
+    highest = 0
+
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        offset = HEADER.size
+        for a in attendees:
+            key = _email_key(a.email)
+            # the first attendee with an email wins, as in the index
+            if key in seen:
+                continue
+            seen.add(key)
+            for t in a.owned_tickets:
+                highest = max(highest, ticket_number(t.id_code))
+                ticket_entries.append((zlib.crc32(t.id_code.encode()), offset))
+
+            key = key.encode()
+            row = json.dumps(datafile.encode_attendee(symbols, a), separators=(",", ":")).encode()
+            entries.append((zlib.crc32(key), offset))
+            f.write(RECORD.pack(len(key), len(row), zlib.crc32(row)))
+            f.write(key)
+            f.write(row)
+            offset += RECORD.size + len(key) + len(row)
+
+        table_offset = offset
+        slots, table = _table(entries)
+        f.write(table)
+        ticket_table_offset = table_offset + len(table)
+        ticket_slots, ticket_table = _table(ticket_entries)
+        f.write(ticket_table)
+
+        catalog = json.dumps({
+            # kiosk databases are tied to the snapshot they were made on
+            "id": os.urandom(8).hex(),
+            "symbols": symbols.names,
+            "exhibitions": [[ex.exhibition_id, ex.title,
+                             [[ws.title, ws.schedule, ws.max_capacity, list(ws.registered_attendees)]
+                              for ws in ex.workshop_list]]
+                            for ex in exhibitions],
+            "sales_categories": sales.categories,
+        }, separators=(",", ":")).encode()
+        catalog_offset = ticket_table_offset + len(ticket_table)
+        f.write(catalog)
+
+        sales_offset = catalog_offset + len(catalog)
+        for column in (sales.day_numbers, sales.category_codes, sales.amounts):
+            if sys.byteorder == "big":
+                column = array(column.typecode, column)
+                column.byteswap()
+            f.write(column.tobytes())
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), slots, highest, table_offset,
+                            catalog_offset, len(catalog), zlib.crc32(catalog),
+                            sales_offset, len(sales), ticket_slots, ticket_table_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+    datafile.sync_dir(filename)
+    return len(entries)
+
+
+# =======================
+# READING
+# =======================
+
+class Snapshot:
+    """
+    A snapshot file mapped read-only. Attendees are decoded from the map
+    when asked for; exhibitions() and sales() give fresh, writable objects,
+    since rosters and sales change while the program runs.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise DataFileError(filename + ": not a GreenWave snapshot")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise DataFileError(filename + ": not a GreenWave snapshot")
+        version = struct.unpack_from("<H", self.map, len(MAGIC))[0]
+        # snapshots are rebuilt from the data, so only the current layout is read
+        if version != VERSION:
+            raise DataFileError(f"{filename}: snapshot version {version}, "
+                                f"rebuild it with snapshot.py")
+        (magic, version, self.count, self.slots, self.highest, self.table_offset,
+         catalog_offset, catalog_length, catalog_crc, self.sales_offset, self.sales_count,
+         self.ticket_slots, self.ticket_table_offset) = HEADER.unpack_from(self.map)
+        if catalog_offset + catalog_length > size:
+            raise DataFileError(filename + ": file is cut short")
+        catalog = self.map[catalog_offset:catalog_offset + catalog_length]
+        if zlib.crc32(catalog) != catalog_crc:
+            raise DataFileError(filename + ": checksum mismatch in the catalog")
+
+        self.catalog = json.loads(catalog)
+        self.symbols = [sys.intern(s) for s in self.catalog["symbols"]]
+        self.mask = self.slots - 1
+
+    def _record(self, offset):
+        key_length, row_length, crc = RECORD.unpack_from(self.map, offset)
+        start = offset + RECORD.size
+        return key_length, row_length, crc, start
+
+    def _find(self, key):
+        key = key.encode()
+        crc = zlib.crc32(key)
+        i = crc & self.mask
+        while True:
+            slot_crc, offset = SLOT.unpack_from(self.map, self.table_offset + i * SLOT.size)
+            if offset == 0:
+                return None
+            if slot_crc == crc:
+                key_length, row_length, row_crc, start = self._record(offset)
+                if self.map[start:start + key_length] == key:
+                    return offset
+            i = (i + 1) & self.mask
+
+    def ticket_owners(self, id_code):
+        """Email keys of the records whose tickets may include id_code (same crc32)."""
+        crc = zlib.crc32(id_code.encode())
+        mask = self.ticket_slots - 1
+        i = crc & mask
+        keys = []
+        while True:
+            slot_crc, offset = SLOT.unpack_from(self.map, self.ticket_table_offset + i * SLOT.size)
+            if offset == 0:
+                return keys
+            if slot_crc == crc:
+                key_length, row_length, row_crc, start = self._record(offset)
+                keys.append(self.map[start:start + key_length].decode())
+            i = (i + 1) & mask
+
+    def decode(self, offset):
+        key_length, row_length, crc, start = self._record(offset)
+        row = self.map[start + key_length:start + key_length + row_length]
+        if zlib.crc32(row) != crc:
+            raise DataFileError(f"{self.filename}: checksum mismatch in the record at {offset}")
+        return datafile.decode_attendee(json.loads(row), self.symbols)
+
+    def get(self, key):
+        """The Attendee stored under an email key, or None."""
+        offset = self._find(key)
+        return None if offset is None else self.decode(offset)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return self.count
+
+    def records(self):
+        """Yield (email key, record offset) in the order attendees registered."""
+        offset = HEADER.size
+        for _ in range(self.count):
+            key_length, row_length, crc, start = self._record(offset)
+            yield self.map[start:start + key_length].decode(), offset
+            offset = start + key_length + row_length
+
+    def exhibitions(self):
+        exhibitions = []
+        for ex_id, title, workshops in self.catalog["exhibitions"]:
+            ex = Exhibition(ex_id, title)
+            for ws_title, schedule, capacity, roster in workshops:
+                ws = Workshop(sys.intern(ws_title), schedule, capacity)
+                for email in roster:
+                    ws.registered_attendees.add(email)
+                ex.workshop_list.append(ws)
+            exhibitions.append(ex)
+        return exhibitions
+
+    def sales(self):
+        sales = SalesColumns()
+        for name in self.catalog["sales_categories"]:
+            sales._category_code(name)
+        offset = self.sales_offset
+        for column in (sales.day_numbers, sales.category_codes, sales.amounts):
+            length = self.sales_count * column.itemsize
+            column.frombytes(self.map[offset:offset + length])
+            if sys.byteorder == "big":
+                column.byteswap()
+            offset += length
+        return sales
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# =======================
+# SNAPSHOT ATTENDEES
+# =======================
+
+class SnapshotAttendees:
+    """
+    Stands in for both Conference_system.attendee_list and attendee_index
+    with SnapshotStorage, like LazyAttendees does for SQLite. An attendee
+    comes from the kiosk database when any kiosk changed them since the
+    snapshot was written, and from the map otherwise; it is decoded on
+    first use and then kept. When another kiosk changes a kept attendee
+    the object is updated in place, so callers holding it stay current.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.snapshot = storage.snapshot
+        self.loaded = {}        # email key -> Attendee handed out
+        self.changed = set()    # keys with a row in the kiosk database
+        self.added = []         # of those, the keys that are not in the snapshot
+        self.lock = threading.Lock()
+
+    def _decode(self, key):
+        if key in self.changed:
+            return self.storage.read_attendee(key)
+        return self.snapshot.get(key)
+
+    def get(self, key, default=None):
+        self.storage.refresh()
+        attendee = self.loaded.get(key)
+        if attendee is not None:
+            return attendee
+        # decoded without the lock, which refresh() takes after the storage's
+        attendee = self._decode(key)
+        if attendee is None:
+            return default
+        with self.lock:
+            # another thread may have decoded it meanwhile
+            return self.loaded.setdefault(key, attendee)
+
+    def row_changed(self, key, attendee):
+        """A newer row for key was read from the kiosk database."""
+        with self.lock:
+            if key not in self.changed:
+                self.changed.add(key)
+                if key not in self.snapshot:
+                    self.added.append(key)
+            kept = self.loaded.get(key)
+            if kept is not None:
+                for name in Attendee.__slots__:
+                    if name != "__weakref__":
+                        setattr(kept, name, getattr(attendee, name))
+
+    def __contains__(self, key):
+        self.storage.refresh()
+        return key in self.loaded or key in self.changed or key in self.snapshot
+
+    def __setitem__(self, key, attendee):
+        with self.lock:
+            self.loaded[key] = attendee
+
+    def append(self, attendee):
+        # add_attendee also sets the index entry, and the row is written
+        # with the attendee_added event
+        pass
+
+    def __len__(self):
+        return len(self.snapshot) + len(self.added)
+
+    def _all(self, keep):
+        for key, offset in self.snapshot.records():
+            attendee = self.loaded.get(key)
+            if attendee is None:
+                if key in self.changed:
+                    attendee = self.storage.read_attendee(key)
+                else:
+                    attendee = self.snapshot.decode(offset)
+                if keep:
+                    with self.lock:
+                        attendee = self.loaded.setdefault(key, attendee)
+            yield attendee
+        for key in list(self.added):
+            attendee = self.get(key) if keep else self.loaded.get(key)
+            yield attendee if attendee is not None else self.storage.read_attendee(key)
+
+    def walk(self):
+        """Every attendee, without keeping the ones decoded on the way."""
+        return self._all(False)
+
+    def __iter__(self):
+        # callers may change what they get (an upgrade from the admin
+        # screen), so each attendee is kept like a lookup would keep it
+        return self._all(True)
+
+
+# =======================
+# SNAPSHOT STORAGE
+# =======================
+
+KIOSK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attendees (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_key TEXT NOT NULL UNIQUE,
+    row TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    id_code TEXT PRIMARY KEY,
+    email_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rosters (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL UNIQUE,
+    emails TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL
+);
+"""
+
+
+class SnapshotStorage:
+    """
+    Storage for kiosks. The snapshot file is mapped read-only and shared
+    by every process on the host; it gives the catalog and the attendees
+    as they were when it was written, and no kiosk ever writes it.
+
+    Everything that changes afterwards goes to the kiosk database, an
+    SQLite file all kiosks share: the full row of every attendee added
+    or changed, the workshop rosters that changed, the new sales and the
+    owners of new tickets. Rows are replaced rather than edited, and
+    their sequence numbers only grow, so a kiosk takes in the others'
+    changes by reading the rows past the last number it saw. Every
+    change runs in transaction(), which holds the database's write lock
+    and first takes in the others' changes, so two kiosks cannot both
+    take the last seat of a workshop.
+
+    To start over from a new snapshot, stop the kiosks and fold the
+    database into the snapshot with "snapshot.py SNAPSHOT --fold DB".
+    """
+
+    def __init__(self, snapshot_file="catalog.snap", kiosk_db="kiosk.db",
+                 ticket_id_file="ticket_ids.dat"):
+        self.snapshot_file = snapshot_file
+        self.kiosk_db = kiosk_db
+        self.lazy = True
+        self.snapshot = None
+        self.attendees = None
+        self.system = None
+        # transactions are begun and ended by hand
+        self.conn = sqlite3.connect(kiosk_db, timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.executescript(KIOSK_SCHEMA)
+        self.lock = threading.RLock()
+        self.seen = {"attendees": 0, "rosters": 0, "sales": 0}
+        self.version = None
+        self.ticket_ids = TicketIdAllocator(ticket_id_file)
+
+    # ------------ LOAD ------------
+
+    def load(self, system):
+        self.snapshot = Snapshot(self.snapshot_file)
+        self.system = system
+        self.attendees = SnapshotAttendees(self)
+        system.attendee_list = self.attendees
+        system.attendee_index = self.attendees
+        system.exhibition_list = self.snapshot.exhibitions()
+        system.sales_list = self.snapshot.sales()
+        with self.lock:
+            self._bind(self.snapshot.catalog.get("id", ""))
+            self.version = self._data_version()
+            self._pull()
+        return []
+
+    def _bind(self, snapshot_id):
+        """Tie the kiosk database to this snapshot, or refuse one tied to another."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'snapshot'").fetchone()
+            if row is None:
+                self.conn.execute("INSERT INTO meta VALUES ('snapshot', ?)", (snapshot_id,))
+            elif row[0] != snapshot_id:
+                raise DataFileError(f"{self.kiosk_db}: holds changes made on another snapshot; "
+                                    f"fold it into that one with snapshot.py --fold, or remove "
+                                    f"it if it was already folded")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def read_attendee(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT row FROM attendees WHERE email_key = ?",
+                                    (key,)).fetchone()
+        return None if row is None else _decode_row(row[0])
+
+    # ------------ OTHER KIOSKS ------------
+
+    def _data_version(self):
+        # changes whenever another connection commits
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _workshops(self, title):
+        for ex in self.system.exhibition_list:
+            for ws in ex.workshop_list:
+                if ws.title == title:
+                    yield ws
+
+    # caller holds self.lock
+    def _pull(self):
+        """Take in the rows committed since the last look."""
+        system = self.system
+        seen = self.seen
+        rows = self.conn.execute("SELECT seq, email_key, row FROM attendees WHERE seq > ? "
+                                 "ORDER BY seq", (seen["attendees"],)).fetchall()
+        for seq, key, row in rows:
+            self.attendees.row_changed(key, _decode_row(row))
+            system.schedules.forget(key)
+            system.access.forget(key)
+            seen["attendees"] = seq
+
+        rows = self.conn.execute("SELECT seq, title, emails FROM rosters WHERE seq > ? "
+                                 "ORDER BY seq", (seen["rosters"],)).fetchall()
+        for seq, title, emails in rows:
+            for ws in self._workshops(title):
+                ws.registered_attendees = OrderedSet(json.loads(emails))
+            seen["rosters"] = seq
+
+        rows = self.conn.execute("SELECT id, day, category, amount FROM sales WHERE id > ? "
+                                 "ORDER BY id", (seen["sales"],)).fetchall()
+        for number, day, category, amount in rows:
+            system._record_sale(day, category, amount)
+            seen["sales"] = number
+
+    def refresh(self):
+        """Take in other kiosks' changes, if there are any."""
+        if self.system is None:
+            return
+        with self.lock:
+            if self.conn.in_transaction:
+                return
+            version = self._data_version()
+            if version != self.version:
+                self.version = version
+                self._pull()
+
+    @contextmanager
+    def transaction(self, system):
+        """
+        Hold the write lock of the kiosk database, up to date with every
+        other kiosk, while a change is checked, made and recorded.
+        """
+        with self.lock:
+            if self.conn.in_transaction:
+                # already inside one, e.g. a waitlist promotion in a cancel
+                yield
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._pull()
+                yield
+                # nothing else committed since the pull, so every row up
+                # to here is either taken in or this kiosk's own
+                for table, column in (("attendees", "seq"), ("rosters", "seq"), ("sales", "id")):
+                    top = self.conn.execute(f"SELECT MAX({column}) FROM {table}").fetchone()[0]
+                    self.seen[table] = max(self.seen[table], top or 0)
+                self.version = self._data_version()
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    # ------------ WRITE ------------
+
+    def _write_attendee(self, key):
+        attendee = self.attendees.get(key)
+        if attendee is None:
+            return
+        self.conn.execute("INSERT OR REPLACE INTO attendees (email_key, row) VALUES (?, ?)",
+                          (key, _encode_row(attendee)))
+        with self.attendees.lock:
+            if key not in self.attendees.changed:
+                self.attendees.changed.add(key)
+                if key not in self.snapshot:
+                    self.attendees.added.append(key)
+
+    def _write_roster(self, system, title):
+        ws = system.catalog.find_workshop(title)
+        if ws is not None:
+            self.conn.execute("INSERT OR REPLACE INTO rosters (title, emails) VALUES (?, ?)",
+                              (title, json.dumps(list(ws.registered_attendees))))
+
+    def _write_sale(self, day, category, amount):
+        self.conn.execute("INSERT INTO sales (day, category, amount) VALUES (?, ?, ?)",
+                          (day, category, amount))
+
+    def _record(self, system, event):
+        kind = event[0]
+        if kind == "default_exhibitions_created":
+            # the catalog comes from the snapshot and is the same on every kiosk
+            return
+
+        key = _email_key(event[1])
+        self._write_attendee(key)
+        if kind == "ticket_issued":
+            ticket = system._ticket_from_event(event)
+            self.conn.execute("INSERT OR REPLACE INTO tickets VALUES (?, ?)", (ticket.id_code, key))
+            self._write_sale(ticket.purchase_date, ticket.category, ticket.cost)
+
+        elif kind in ("booking_made", "booking_cancelled"):
+            self._write_roster(system, event[2])
+
+        elif kind == "ticket_cancelled":
+            id_code, day, refund, dropped = event[2:]
+            self.conn.execute("DELETE FROM tickets WHERE id_code = ?", (id_code,))
+            for title in dropped:
+                self._write_roster(system, title)
+            self._write_sale(day, "Refund", -refund)
+
+        elif kind == "upgrade_applied":
+            self._write_sale(event[4], "Upgrade", 50.0)
+
+    def record(self, system, event):
+        with self.transaction(system):
+            self._record(system, event)
+
+    def record_many(self, system, events):
+        with self.transaction(system):
+            for event in events:
+                self._record(system, event)
+
+    def highest_ticket_number(self):
+        with self.lock:
+            ids = [row[0] for row in self.conn.execute("SELECT id_code FROM tickets")]
+        return max([self.snapshot.highest] + [ticket_number(i) for i in ids])
+
+    def ticket_owner(self, id_code):
+        """Email key of the attendee holding ticket id_code, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT email_key FROM tickets WHERE id_code = ?",
+                                    (id_code,)).fetchone()
+        keys = [] if row is None else [row[0]]
+        for key in keys + self.snapshot.ticket_owners(id_code):
+            attendee = self.attendees.get(key)
+            if attendee is not None and any(t.id_code == id_code for t in attendee.owned_tickets):
+                return key
+        return None
+
+    def store(self, system):
+        # every change is in the kiosk database once recorded, and the
+        # shared snapshot is only ever rewritten by snapshot.py --fold
+        pass
+
+    def compact_due(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+
+def _encode_row(attendee):
+    symbols = _Symbols()
+    row = datafile.encode_attendee(symbols, attendee)
+    return json.dumps([symbols.names, row], separators=(",", ":"))
+
+
+def _decode_row(text):
+    names, row = json.loads(text)
+    return datafile.decode_attendee(row, [sys.intern(name) for name in names])
+
+
+def fold_kiosk_changes(snapshot_file, kiosk_db):
+    """
+    Write a new snapshot holding the kiosks' changes and empty the kiosk
+    database for it. Run it while no kiosk is running.
+    """
+    storage = SnapshotStorage(snapshot_file, kiosk_db)
+    try:
+        system = Conference_system(storage)
+        system.load_all_data()
+        # the old file stays mapped while it is read for the new one, which
+        # write_snapshot renames over it
+        count = write_snapshot(snapshot_file, storage.attendees.walk(),
+                               system.exhibition_list, system.sales_list)
+        with Snapshot(snapshot_file) as snapshot:
+            snapshot_id = snapshot.catalog["id"]
+        with storage.lock:
+            storage.conn.execute("BEGIN IMMEDIATE")
+            for table in ("attendees", "tickets", "rosters", "sales"):
+                storage.conn.execute("DELETE FROM " + table)
+            storage.conn.execute("UPDATE meta SET value = ? WHERE name = 'snapshot'", (snapshot_id,))
+            storage.conn.execute("COMMIT")
+    finally:
+        storage.close()
+    return count
+
+
+# =======================
+# COMMAND LINE
+# =======================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a memory-mapped snapshot for kiosks")
+    parser.add_argument("output", nargs="?", default="catalog.snap")
+    parser.add_argument("--db", help="SQLite database (default: the .dat files)")
+    parser.add_argument("--fold", metavar="KIOSK_DB",
+                        help="rewrite the snapshot in output with the changes in a kiosk database")
+    args = parser.parse_args()
+
+    if args.fold:
+        count = fold_kiosk_changes(args.output, args.fold)
+    else:
+        system = Conference_system(SQLiteStorage(args.db) if args.db else None)
+        system.load_all_data()
+        count = write_snapshot(args.output, system.attendee_list, system.exhibition_list,
+                               system.sales_list)
+        system.storage.close()
+    print(f"Wrote {count} attendees to {args.output}")
@@ -0,0 +1,590 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import datafile
+from journal import Journal
+from id_allocator import TicketIdAllocator
+from data_classes import (
+    Conference_system,
+    OrderedSet,
+    Attendee,
+    ExhibitionPass,
+    AllAccessPass,
+    Workshop,
+    Exhibition
+)
+
+
+# =======================
+# PICKLE STORAGE
+# =======================
+
+class PickleStorage:
+    """
+    Original storage: three .dat snapshots plus a journal of the events
+    that happened since the last snapshot. The snapshots used to be
+    pickles; they are now written in the checksummed format of
+    datafile.py, and old pickled ones are still read.
+
+    The manifest records the number of the last journal event the
+    snapshot holds; see store().
+    """
+
+    def __init__(self, journal_file="journal.dat", compact_every=10000,
+                 attendee_file="attendees.dat", exhibition_file="exhibitions.dat",
+                 sales_file="sales.dat", ticket_id_file="ticket_ids.dat",
+                 manifest_file="manifest.dat"):
+        self.attendee_file = attendee_file
+        self.exhibition_file = exhibition_file
+        self.sales_file = sales_file
+        self.manifest_file = manifest_file
+        self.compact_every = compact_every
+        self.lazy = False
+        self.journal = Journal(journal_file)
+        self.ticket_ids = TicketIdAllocator(ticket_id_file)
+
+    def _snapshot_files(self):
+        return ((self.attendee_file, "attendees"),
+                (self.exhibition_file, "exhibitions"),
+                (self.sales_file, "sales"))
+
+    def _write_manifest(self, seq, pending):
+        datafile.save(self.manifest_file, "manifest", {"seq": seq, "pending": pending})
+
+    def _read_manifest(self):
+        try:
+            return datafile.load(self.manifest_file, "manifest")
+        except FileNotFoundError:
+            # files from before the manifest; every journaled event is new
+            return {"seq": 0, "pending": False}
+
+    def _recover(self):
+        """Finish or throw away a store() that a crash cut short."""
+        manifest = self._read_manifest()
+        for filename, kind in self._snapshot_files():
+            tmp = filename + ".tmp"
+            if not os.path.exists(tmp):
+                continue
+            if manifest["pending"]:
+                os.replace(tmp, filename)
+                datafile.sync_dir(filename)
+            else:
+                # the manifest was never written, so the old files stand
+                os.remove(tmp)
+        if manifest["pending"]:
+            self._write_manifest(manifest["seq"], False)
+        return manifest
+
+    # a damaged file raises DataFileError instead of loading as empty,
+    # which the next save would then write over every attendee
+    def _load_file(self, filename, kind):
+        try:
+            return datafile.load_any(filename, kind)
+        except FileNotFoundError:
+            return []
+
+    def load(self, system):
+        manifest = self._recover()
+        system.attendee_list = self._load_file(self.attendee_file, "attendees")
+        system.exhibition_list = self._load_file(self.exhibition_file, "exhibitions")
+        system.sales_list = self._load_file(self.sales_file, "sales")
+        # replayed by the system on top of the snapshot
+        return self.journal.read_events(after=manifest["seq"])
+
+    def store(self, system):
+        """
+        Write the three files as .tmp, then the manifest, then rename them.
+        The manifest is the commit point: a crash before it leaves the old
+        snapshot and the whole journal, a crash after it is finished by
+        the next load(), and either way each event is applied once.
+        """
+        data = {"attendees": system.attendee_list,
+                "exhibitions": system.exhibition_list,
+                "sales": system.sales_list}
+        for filename, kind in self._snapshot_files():
+            datafile.write_file(filename + ".tmp", kind, datafile.ENCODERS[kind], data[kind])
+        seq = self.journal.last_seq
+        self._write_manifest(seq, True)
+        for filename, kind in self._snapshot_files():
+            os.replace(filename + ".tmp", filename)
+            datafile.sync_dir(filename)
+        self._write_manifest(seq, False)
+        # the snapshot now holds every journaled event
+        self.journal.clear()
+
+    def transaction(self, system):
+        # one process owns the files, so there is nobody to keep in step with
+        return nullcontext()
+
+    def record(self, system, event):
+        self.journal.append(event)
+
+    def record_many(self, system, events):
+        self.journal.extend(events)
+
+    def compact_due(self):
+        return len(self.journal) >= self.compact_every
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        self.journal.close()
+
+
+# =======================
+# SQLITE STORAGE
+# =======================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendees (
+    email_key TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS exhibitions (
+    title TEXT PRIMARY KEY,
+    exhibition_id TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workshops (
+    exhibition_title TEXT NOT NULL REFERENCES exhibitions(title),
+    title TEXT NOT NULL,
+    schedule TEXT NOT NULL,
+    max_capacity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS workshops_title ON workshops(title);
+CREATE TABLE IF NOT EXISTS tickets (
+    id_code TEXT PRIMARY KEY,
+    email_key TEXT NOT NULL REFERENCES attendees(email_key),
+    category TEXT NOT NULL,
+    cost REAL NOT NULL,
+    purchase_date TEXT NOT NULL,
+    all_access INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tickets_email ON tickets(email_key);
+CREATE TABLE IF NOT EXISTS ticket_exhibitions (
+    id_code TEXT NOT NULL REFERENCES tickets(id_code),
+    exhibition_title TEXT NOT NULL,
+    PRIMARY KEY (id_code, exhibition_title)
+);
+CREATE TABLE IF NOT EXISTS ticket_workshops (
+    id_code TEXT NOT NULL REFERENCES tickets(id_code),
+    workshop_title TEXT NOT NULL,
+    PRIMARY KEY (id_code, workshop_title)
+);
+CREATE TABLE IF NOT EXISTS registrations (
+    email_key TEXT NOT NULL REFERENCES attendees(email_key),
+    workshop_title TEXT NOT NULL,
+    PRIMARY KEY (email_key, workshop_title)
+);
+CREATE INDEX IF NOT EXISTS registrations_workshop ON registrations(workshop_title);
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sales_day ON sales(day);
+"""
+
+
+class SQLiteStorage:
+    """
+    Normalized SQLite database. Every journaled event is written in its
+    own transaction, so there is nothing left to save when the app closes.
+
+    With lazy=True only the catalog, the workshop rosters, the sales and
+    the set of registered emails are read at startup; attendees and their
+    tickets are read on first use and kept in an LRU cache.
+    """
+
+    def __init__(self, filename="conference.db", lazy=False, cache_size=1000):
+        self.filename = filename
+        self.lazy = lazy
+        self.cache_size = cache_size
+        self.attendees = None
+        # one connection shared by every thread, one statement batch at a time
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        # the numbers live beside the database, locked like the .dat one
+        self.ticket_ids = TicketIdAllocator(filename + ".ids")
+
+    def _email_key(self, email):
+        return email.strip().lower()
+
+    # ------------ LOAD ------------
+
+    def load(self, system):
+        cur = self.conn.cursor()
+
+        exhibitions = {}
+        for ex_id, title in cur.execute(
+                "SELECT exhibition_id, title FROM exhibitions ORDER BY position"):
+            exhibitions[title] = Exhibition(ex_id, title)
+
+        workshops = {}
+        for ex_title, title, schedule, cap in cur.execute(
+                "SELECT exhibition_title, title, schedule, max_capacity "
+                "FROM workshops ORDER BY rowid"):
+            ws = Workshop(title, schedule, cap)
+            exhibitions[ex_title].insert_workshop(ws)
+            workshops.setdefault(title, ws)
+
+        for email, ws_title in cur.execute(
+                "SELECT a.email, r.workshop_title FROM registrations r "
+                "JOIN attendees a ON a.email_key = r.email_key ORDER BY r.rowid"):
+            if ws_title in workshops:
+                workshops[ws_title].registered_attendees.add(email)
+
+        system.exhibition_list = list(exhibitions.values())
+        system.sales_list = [tuple(row) for row in cur.execute(
+            "SELECT day, category, amount FROM sales ORDER BY id")]
+
+        if self.lazy:
+            keys = [row[0] for row in cur.execute(
+                "SELECT email_key FROM attendees ORDER BY rowid")]
+            self.attendees = LazyAttendees(self, keys)
+            system.attendee_list = self.attendees
+            system.attendee_index = self.attendees
+        else:
+            system.attendee_list = self.read_attendees()
+        return []
+
+    def read_attendees(self, keys=None):
+        """Build Attendee objects with their tickets, for all rows or just `keys`."""
+        if keys is not None and len(keys) == 0:
+            return []
+        with self.lock:
+            return self._read_attendees(keys)
+
+    def _read_attendees(self, keys):
+        cur = self.conn.cursor()
+        if keys is None:
+            where = ""
+            ticket_where = ""
+            params = ()
+        else:
+            marks = ",".join("?" * len(keys))
+            where = " WHERE email_key IN (" + marks + ")"
+            ticket_where = " WHERE id_code IN (SELECT id_code FROM tickets" + where + ")"
+            params = tuple(keys)
+
+        attendees = {}
+        for key, email, name, password in cur.execute(
+                "SELECT email_key, email, full_name, password FROM attendees"
+                + where + " ORDER BY rowid", params):
+            attendees[key] = Attendee(email, name, password)
+
+        ex_titles = {}
+        for id_code, ex_title in cur.execute(
+                "SELECT id_code, exhibition_title FROM ticket_exhibitions"
+                + ticket_where + " ORDER BY rowid", params):
+            ex_titles.setdefault(id_code, []).append(ex_title)
+
+        ws_titles = {}
+        for id_code, ws_title in cur.execute(
+                "SELECT id_code, workshop_title FROM ticket_workshops"
+                + ticket_where + " ORDER BY rowid", params):
+            ws_titles.setdefault(id_code, OrderedSet()).add(sys.intern(ws_title))
+
+        for id_code, key, category, cost, day, all_access in cur.execute(
+                "SELECT id_code, email_key, category, cost, purchase_date, all_access "
+                "FROM tickets" + where + " ORDER BY rowid", params):
+            if all_access:
+                ticket = AllAccessPass(id_code)
+            else:
+                ticket = ExhibitionPass(id_code, ex_titles.get(id_code, []))
+                ticket.allowed_workshops = ws_titles.get(id_code, OrderedSet())
+            ticket.category = category
+            ticket.cost = cost
+            ticket.purchase_date = day
+            attendees[key].assign_ticket(ticket)
+
+        for key, ws_title in cur.execute(
+                "SELECT email_key, workshop_title FROM registrations"
+                + where + " ORDER BY rowid", params):
+            attendee = attendees[key]
+            attendee.add_booking(ws_title)
+            # which ticket a booking uses is not stored; it is the first
+            # ticket that covers the workshop, as when it was booked
+            ticket = attendee.ticket_for(ws_title)
+            if ticket is not None:
+                ticket.add_booking(ws_title)
+
+        return list(attendees.values())
+
+    # ------------ WRITE ------------
+
+    def _insert_catalog(self, system):
+        self.conn.execute("DELETE FROM workshops")
+        self.conn.execute("DELETE FROM exhibitions")
+        for pos, ex in enumerate(system.exhibition_list):
+            self.conn.execute("INSERT INTO exhibitions VALUES (?, ?, ?)",
+                              (ex.title, ex.exhibition_id, pos))
+            for ws in ex.workshop_list:
+                self.conn.execute("INSERT INTO workshops VALUES (?, ?, ?, ?)",
+                                  (ex.title, ws.title, ws.schedule, ws.max_capacity))
+
+    def _insert_attendee(self, email, full_name, password):
+        self.conn.execute("INSERT INTO attendees VALUES (?, ?, ?, ?)",
+                          (self._email_key(email), email, full_name, password))
+
+    def _insert_ticket(self, email, ticket):
+        all_access = isinstance(ticket, AllAccessPass)
+        self.conn.execute("INSERT INTO tickets VALUES (?, ?, ?, ?, ?, ?)",
+                          (ticket.id_code, self._email_key(email), ticket.category,
+                           ticket.cost, ticket.purchase_date, int(all_access)))
+        if not all_access:
+            self._insert_ticket_access(ticket.id_code, ticket.exhibitions,
+                                       ticket.allowed_workshops)
+
+    def _insert_ticket_access(self, id_code, exhibitions, workshops):
+        self.conn.executemany("INSERT OR IGNORE INTO ticket_exhibitions VALUES (?, ?)",
+                              [(id_code, t) for t in exhibitions])
+        self.conn.executemany("INSERT OR IGNORE INTO ticket_workshops VALUES (?, ?)",
+                              [(id_code, t) for t in workshops])
+
+    def _insert_sale(self, sale):
+        self.conn.execute("INSERT INTO sales (day, category, amount) VALUES (?, ?, ?)", sale)
+
+    def store(self, system):
+        # every event was committed when it was recorded, so only the
+        # catalog, which the admin can edit in place, is written again
+        with self.lock, self.conn:
+            self._insert_catalog(system)
+
+    def rewrite(self, system):
+        """
+        Replace every row with the state of system: for importing data
+        from elsewhere and for saving what fsck repaired.
+        """
+        # read before anything is deleted: a lazy attendee list streams
+        # its rows from the tables emptied below
+        attendees = list(system.attendee_list)
+        sales = list(system.sales_list)
+        with self.lock, self.conn:
+            for table in ("registrations", "ticket_workshops", "ticket_exhibitions",
+                          "tickets", "attendees", "sales"):
+                self.conn.execute("DELETE FROM " + table)
+            self._insert_catalog(system)
+
+            for attendee in attendees:
+                self._insert_attendee(attendee.email, attendee.full_name, attendee.password)
+                for ticket in attendee.owned_tickets:
+                    self._insert_ticket(attendee.email, ticket)
+                key = self._email_key(attendee.email)
+                self.conn.executemany("INSERT INTO registrations VALUES (?, ?)",
+                                      [(key, t) for t in attendee.booked_workshops])
+
+            for sale in sales:
+                self._insert_sale(sale)
+
+    def transaction(self, system):
+        # each event is its own transaction; see record()
+        return nullcontext()
+
+    # everything is taken from the event itself: in lazy mode the object
+    # that was changed is not necessarily the one held in the cache
+    def record(self, system, event):
+        with self.lock, self.conn:
+            self._record(system, event)
+
+    def record_many(self, system, events):
+        """Write a whole batch of events in a single transaction."""
+        with self.lock, self.conn:
+            for event in events:
+                self._record(system, event)
+
+    def _record(self, system, event):
+        kind = event[0]
+        if kind == "default_exhibitions_created":
+            self._insert_catalog(system)
+            return
+
+        email = event[1]
+        if kind == "attendee_added":
+            self._insert_attendee(email, event[2], event[3])
+
+        elif kind == "ticket_issued":
+            ticket = system._ticket_from_event(event)
+            self._insert_ticket(email, ticket)
+            self._insert_sale((ticket.purchase_date, ticket.category, ticket.cost))
+
+        elif kind == "booking_made":
+            self.conn.execute("INSERT OR IGNORE INTO registrations VALUES (?, ?)",
+                              (self._email_key(email), event[2]))
+
+        elif kind == "booking_cancelled":
+            self.conn.execute("DELETE FROM registrations WHERE email_key = ? AND workshop_title = ?",
+                              (self._email_key(email), event[2]))
+
+        elif kind == "ticket_cancelled":
+            id_code, day, refund, dropped = event[2:]
+            for table in ("ticket_workshops", "ticket_exhibitions", "tickets"):
+                self.conn.execute("DELETE FROM " + table + " WHERE id_code = ?", (id_code,))
+            self.conn.executemany(
+                "DELETE FROM registrations WHERE email_key = ? AND workshop_title = ?",
+                [(self._email_key(email), title) for title in dropped])
+            self._insert_sale((day, "Refund", -refund))
+
+        elif kind == "upgrade_applied":
+            id_code, exhibition_title, day = event[2:]
+            self._insert_ticket_access(id_code, [exhibition_title],
+                                       system.catalog.exhibition_workshops[exhibition_title])
+            self.conn.execute("UPDATE tickets SET cost = cost + 50.0 WHERE id_code = ?",
+                              (id_code,))
+            self._insert_sale((day, "Upgrade", 50.0))
+
+    def highest_ticket_number(self):
+        # the digits at the end of the id, as data_classes.ticket_number
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(CAST(substr(id_code, length(rtrim(id_code, '0123456789')) + 1) "
+                "AS INTEGER)) FROM tickets").fetchone()
+        return row[0] or 0
+
+    def ticket_owner(self, id_code):
+        """Email key of the attendee holding ticket id_code, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT email_key FROM tickets WHERE id_code = ?",
+                                    (id_code,)).fetchone()
+        return None if row is None else row[0]
+
+    def compact_due(self):
+        # every event is already in the database
+        return False
+
+    def flush(self):
+        # each event was committed when it was recorded
+        pass
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# =======================
+# LAZY ATTENDEES
+# =======================
+
+class LazyAttendees:
+    """
+    Stands in for both Conference_system.attendee_list and attendee_index
+    when SQLiteStorage is lazy. Only the email keys live in memory; full
+    Attendee objects are read from the database when asked for and the
+    least recently used ones are dropped once cache_size is reached.
+
+    An attendee that is still in use somewhere is never read a second
+    time: the system changes the object it holds and records the event,
+    so a fresh copy from the database would sit beside it and go stale.
+    """
+
+    def __init__(self, storage, keys):
+        self.storage = storage
+        self.keys = set(keys)
+        self.cache = OrderedDict()
+        # every attendee handed out, for as long as anyone holds it
+        self.live = weakref.WeakValueDictionary()
+
+    def _remember(self, key, attendee):
+        self.live[key] = attendee
+        self.cache[key] = attendee
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.storage.cache_size:
+            self.cache.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self.storage.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            if key not in self.keys:
+                return default
+            attendee = self.live.get(key)
+            if attendee is None:
+                attendee = self.storage.read_attendees([key])[0]
+            self._remember(key, attendee)
+            return attendee
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __setitem__(self, key, attendee):
+        with self.storage.lock:
+            self.keys.add(key)
+            self._remember(key, attendee)
+
+    def append(self, attendee):
+        # add_attendee also sets the index entry, which does the work
+        pass
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        # walk the table in chunks of rowids; live objects are returned as
+        # they are and the rest are read without filling the cache
+        last_rowid = 0
+        while True:
+            with self.storage.lock:
+                rows = self.storage.conn.execute(
+                    "SELECT rowid, email_key FROM attendees WHERE rowid > ? "
+                    "ORDER BY rowid LIMIT 500", (last_rowid,)).fetchall()
+                if len(rows) == 0:
+                    return
+                last_rowid = rows[-1][0]
+                chunk = {}
+                missing = []
+                for _, k in rows:
+                    attendee = self.live.get(k)
+                    if attendee is not None:
+                        chunk[k] = attendee
+                    else:
+                        missing.append(k)
+                for a in self.storage.read_attendees(missing):
+                    k = self.storage._email_key(a.email)
+                    chunk[k] = a
+                    self.live[k] = a
+            for _, k in rows:
+                yield chunk[k]
+
+
+# =======================
+# MIGRATION
+# =======================
+
+def migrate_pickle_to_sqlite(db_file="conference.db", data_dir="."):
+    """Import the .dat files (and any unsaved journal) into an SQLite database."""
+    source = Conference_system(PickleStorage(
+        os.path.join(data_dir, "journal.dat"),
+        attendee_file=os.path.join(data_dir, "attendees.dat"),
+        exhibition_file=os.path.join(data_dir, "exhibitions.dat"),
+        sales_file=os.path.join(data_dir, "sales.dat"),
+        ticket_id_file=os.path.join(data_dir, "ticket_ids.dat"),
+        manifest_file=os.path.join(data_dir, "manifest.dat")
+    ))
+    source.load_all_data()
+
+    target = SQLiteStorage(db_file)
+    target.rewrite(source)
+    target.close()
+    return len(source.attendee_list), len(source.sales_list)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import GreenWave .dat files into SQLite")
+    parser.add_argument("db_file", nargs="?", default="conference.db")
+    parser.add_argument("--data-dir", default=".", help="folder holding the .dat files")
+    args = parser.parse_args()
+
+    attendees, sales = migrate_pickle_to_sqlite(args.db_file, args.data_dir)
+    print(f"Imported {attendees} attendees and {sales} sales into {args.db_file}")
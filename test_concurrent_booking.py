@@ -0,0 +1,67 @@
+import random
+import threading
+import unittest
+
+from benchmarks import make_booking_system, overbooking_problems
+
+
+# =======================
+# CONCURRENT BOOKING
+# =======================
+
+class ConcurrentBookingTest(unittest.TestCase):
+    """
+    Many threads book the same few workshops at once. No workshop may end
+    up with more attendees than seats, and rosters, bookings and tickets
+    must still agree with each other afterwards.
+    """
+
+    def book_from_threads(self, threads, attempts, workshops, capacity, attendees):
+        system, people = make_booking_system(workshops, capacity, attendees)
+        titles = list(system.catalog.workshops)
+        start_line = threading.Barrier(threads)
+        booked = [0] * threads
+        errors = []
+
+        def worker(n):
+            rng = random.Random(n)
+            start_line.wait()
+            try:
+                for _ in range(attempts // threads):
+                    ok, msg = system.process_workshop_reservation(
+                        rng.choice(people), rng.choice(titles))
+                    if ok:
+                        booked[n] += 1
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        self.assertEqual(errors, [])
+        return system, sum(booked)
+
+    def check_system(self, system, booked):
+        self.assertEqual(overbooking_problems(system), [])
+        self.assertEqual(system.check_invariants(), [])
+        seats = sum(len(ws.registered_attendees) for ws in system.catalog.workshops.values())
+        self.assertEqual(seats, booked)
+
+    def test_no_overbooking_with_many_threads(self):
+        system, booked = self.book_from_threads(8, 20_000, 50, 25, 2_000)
+        self.check_system(system, booked)
+
+    def test_last_seats_go_to_one_thread_each(self):
+        # far more attempts than seats, so every workshop fills up and the
+        # threads race for the last seat of each
+        system, booked = self.book_from_threads(16, 8_000, 4, 5, 500)
+        self.check_system(system, booked)
+        for ws in system.catalog.workshops.values():
+            self.assertEqual(len(ws.registered_attendees), ws.max_capacity)
+
+
+if __name__ == "__main__":
+    unittest.main()